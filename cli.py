@@ -0,0 +1,194 @@
+import argparse
+import datetime
+import logging
+import os
+import sys
+
+# Set up logging configurations.
+logging.basicConfig(
+    filename='app.log',
+    filemode='a',
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+BRANCHES = ['Todas', '0101', '0103', '0104', '0105']
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD command line date."""
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def run_suggest(args):
+    from main_functions.sugestao_compra import create_final_df
+    create_final_df(args.filial, True, consolidated=args.consolidated)
+
+
+def run_report(args):
+    from main_functions.analise_inventario import create_report
+    report_df = create_report(args.filial, f"{args.periodo} meses", False, consolidated=args.consolidated,
+                              process_pool=args.processes)
+    data_as_of = report_df.attrs.get('data_as_of')
+    if data_as_of is not None:
+        print(f"Data as of {data_as_of:%Y-%m-%d %H:%M}")
+
+
+def run_tables(args):
+    from main_functions.download_tabelas import download_tabelas
+    download_tabelas(args.filial, args.saldo, args.pedidos, args.faturamento, args.pedidos_desde,
+                     args.faturamento_desde, consolidated=args.consolidated)
+
+
+def run_table(args):
+    from main_functions.busca_tabelas import preview_table, download_save_table
+
+    table = args.table.upper()
+    columns = [column.strip().upper() for column in args.columns.split(',')]
+    filters = {'filial': args.filial, 'date_from': args.desde, 'date_to': args.ate}
+
+    if args.preview:
+        print(preview_table(columns, table, limit=args.preview, **filters).to_string())
+    else:
+        download_save_table(columns, table, **filters)
+
+
+def run_refresh(args):
+    """
+    Nightly refresh of the local parameters: Dados_Sug.xlsx, Base_df, the stock indicator and the
+    inventory snapshot, the same work the application starts when it is opened.
+    """
+    from database_functions.params_update import save_excel_locally
+    from main_functions.sugestao_compra import update_base_df
+    from main_functions.analise_inventario import update_inventory_snapshot
+
+    save_excel_locally("Dados_Sug.xlsx", shared_folder_path=args.shared_folder)
+    update_base_df()
+    update_inventory_snapshot()
+
+
+def run_timings(args):
+    from database_functions.timing import summarize
+    summarize(args.spans)
+
+
+def run_slow_queries(args):
+    from database_functions.query_profiler import slowest_queries
+    rows = slowest_queries(args.limit)
+    if not rows:
+        print("No profiled queries. Enable them with 'enabled = true' in the [profiling] section of db_config.ini.")
+    for query_fingerprint, statement, runs, avg_time, max_time, first_row, avg_rows, avg_bytes in rows:
+        print(f"{query_fingerprint}  runs={runs}  avg={avg_time:.2f}s  max={max_time:.2f}s  "
+              f"first_row={first_row or 0:.2f}s  rows={avg_rows:.0f}  bytes={avg_bytes:.0f}")
+        print(f"    {statement[:160]}")
+
+
+def run_benchmark(args):
+    from database_functions import queries
+    from database_functions.funcoes_base import benchmark_fetch
+
+    since = args.desde.strftime('%Y%m%d')
+    query_params = {
+        'saldo_analitico': (args.filial, args.filial),
+        'pedidos': (since, args.filial),
+        'faturamento': (since, args.filial),
+        'info_gerais': (args.filial,),
+        'historico_faturamento': (args.filial, -4),
+        'quantidade_receber': (args.filial,),
+    }
+
+    results = benchmark_fetch(getattr(queries, args.query), query_params[args.query], repeat=args.repeat)
+    for backend, (best, rows) in results.items():
+        print(f"{backend:<10}{best:>10.2f}s{rows:>12} rows")
+
+
+def build_parser():
+    default_date = datetime.date.today() - datetime.timedelta(days=30)
+
+    parser = argparse.ArgumentParser(description="Run the stock pipelines without the graphical interface.")
+    parser.add_argument('--out', help="Folder for the result files. Defaults to Desktop\\Resultado.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    suggest = subparsers.add_parser('suggest', help="Purchase suggestion (create_final_df).")
+    suggest.add_argument('--filial', choices=BRANCHES, default='Todas')
+    suggest.add_argument('--consolidated', action='store_true', help="One workbook with one sheet per branch.")
+    suggest.set_defaults(handler=run_suggest)
+
+    report = subparsers.add_parser('report', help="Inventory analysis report (create_report).")
+    report.add_argument('--filial', choices=BRANCHES, default='Todas')
+    report.add_argument('--periodo', type=int, choices=[3, 6, 12, 24], default=12, help="Period in months.")
+    report.add_argument('--consolidated', action='store_true', help="One workbook with one sheet per branch.")
+    report.add_argument('--processes', action='store_true', help="Experimental: compute the branches in worker processes.")
+    report.set_defaults(handler=run_report)
+
+    tables = subparsers.add_parser('tables', help="Saldo, pedidos and faturamento exports (download_tabelas).")
+    tables.add_argument('--filial', choices=BRANCHES, default='Todas')
+    tables.add_argument('--saldo', action='store_true')
+    tables.add_argument('--pedidos', action='store_true')
+    tables.add_argument('--faturamento', action='store_true')
+    tables.add_argument('--pedidos-desde', type=parse_date, default=default_date, help="YYYY-MM-DD")
+    tables.add_argument('--faturamento-desde', type=parse_date, default=default_date, help="YYYY-MM-DD")
+    tables.add_argument('--consolidated', action='store_true', help="One workbook with one sheet per branch.")
+    tables.set_defaults(handler=run_tables)
+
+    table = subparsers.add_parser('table', help="Export columns of a database table (download_save_table).")
+    table.add_argument('--table', required=True)
+    table.add_argument('--columns', required=True, help="Comma separated column names.")
+    table.add_argument('--filial', choices=BRANCHES, help="Only the rows of a branch.")
+    table.add_argument('--desde', type=parse_date, help="First emission date, YYYY-MM-DD.")
+    table.add_argument('--ate', type=parse_date, help="Last emission date, YYYY-MM-DD.")
+    table.add_argument('--preview', type=int, metavar='N', help="Print the first N rows instead of exporting.")
+    table.set_defaults(handler=run_table)
+
+    refresh = subparsers.add_parser('refresh', help="Rebuild Base_df, the stock indicator and the inventory snapshot.")
+    refresh.add_argument('--shared-folder', default="Z:\\09 - Pecas\\Sgc", help="Folder holding Dados_Sug.xlsx.")
+    refresh.set_defaults(handler=run_refresh)
+
+    timings = subparsers.add_parser('timings', help="p50/p95 duration per stage from the recorded spans.")
+    timings.add_argument('--spans', default=os.path.join('params', 'spans.jsonl'),
+                         help="Spans file written by the pipelines when [timing] spans = true.")
+    timings.set_defaults(handler=run_timings)
+
+    slow_queries = subparsers.add_parser('slow-queries', help="Slowest profiled queries.")
+    slow_queries.add_argument('--limit', type=int, default=10)
+    slow_queries.set_defaults(handler=run_slow_queries)
+
+    benchmark = subparsers.add_parser('benchmark', help="Compare the fetch backends on the same query.")
+    benchmark.add_argument('--query', default='pedidos',
+                           choices=['saldo_analitico', 'pedidos', 'faturamento', 'info_gerais',
+                                    'historico_faturamento', 'quantidade_receber'])
+    benchmark.add_argument('--filial', choices=BRANCHES[1:], default='0101')
+    benchmark.add_argument('--desde', type=parse_date, default=default_date, help="YYYY-MM-DD")
+    benchmark.add_argument('--repeat', type=int, default=3)
+    benchmark.set_defaults(handler=run_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Headless entry point for the pipelines, meant for scheduled runs.
+
+    Example:
+        python cli.py --out D:\\Relatorios suggest --filial Todas --consolidated
+    """
+    args = build_parser().parse_args(argv)
+
+    from database_functions.funcoes_base import configure_output
+    configure_output(folder=args.out, open_files=False)
+
+    try:
+        logging.info(f"Running '{args.command}' from the command line.")
+        args.handler(args)
+        logging.info(f"Command '{args.command}' finished.")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while running '{args.command}': {e}")
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    # If the script is executed as the main module, run the requested command.
+    sys.exit(main())
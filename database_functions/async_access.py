@@ -0,0 +1,200 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# Queries running at the same time through the async layer, kept low to spare the ERP database
+ASYNC_MAX_WORKERS = 4
+
+# Worker threads running the blocking driver calls for the event loops, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+# Idents of the worker threads running a call, whose queries are cancelled when the application closes
+_busy_workers = set()
+
+
+def executor():
+    """
+    Get the worker thread pool, creating it on first use.
+
+    The workers are not daemon threads, so the interpreter waits for them when it exits, before any atexit
+    handler runs. Whoever stops the application early must call shutdown_workers first, as main.py does on
+    QApplication.aboutToQuit, so the queries still running are cancelled instead of waited for.
+
+    Returns:
+    - ThreadPoolExecutor: The worker pool.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=ASYNC_MAX_WORKERS,
+                                                              thread_name_prefix='fetch')
+        return _executor
+
+
+def shutdown_workers():
+    """
+    Stop the worker pool without waiting: queued calls are dropped and the queries still running are
+    cancelled at the driver level, so a long query does not keep the application from closing. Connected
+    to QApplication.aboutToQuit, and run again at interpreter exit to release the pool of other callers.
+    """
+    global _executor
+    from database_functions.cancellation import cancel_active_queries
+
+    with _executor_lock:
+        pool, _executor = _executor, None
+        busy_workers = list(_busy_workers)
+    if pool is None:
+        return
+
+    for ident in busy_workers:
+        cancel_active_queries(ident)
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.info(f"Worker pool shut down, {len(busy_workers)} running calls cancelled.")
+
+
+# Last resort for callers that did not shut the pool down themselves; it runs once the workers are idle
+atexit.register(shutdown_workers)
+
+
+async def run_in_worker(func, *args, **kwargs):
+    """
+    Run a blocking data access function in a worker thread and await its result.
+
+    Cancelling the awaiting task cancels the queries of the worker at the driver level, and cancelling
+    the thread driving the event loop, e.g. with DownloadThread.cancel, cancels them as well.
+
+    Parameters:
+    - func (callable): The blocking function, such as download.
+    - *args, **kwargs: Arguments of the function.
+
+    Returns:
+    - The value returned by func.
+    """
+    from database_functions.cancellation import adopt_thread, release_thread, cancel_active_queries
+
+    parent_ident = threading.get_ident()
+    worker = {'ident': None, 'done': False}
+
+    def run():
+        worker['ident'] = threading.get_ident()
+        with _executor_lock:
+            _busy_workers.add(worker['ident'])
+        adopt_thread(parent_ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            worker['done'] = True
+            release_thread(parent_ident)
+            with _executor_lock:
+                _busy_workers.discard(worker['ident'])
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor(), run)
+    except asyncio.CancelledError:
+        if worker['ident'] is not None and not worker['done']:
+            cancel_active_queries(worker['ident'])
+        raise
+
+
+async def fetch_df(query, params=None, family=None, backend=None):
+    """
+    Asynchronous counterpart of download.
+
+    Usage:
+        info_df, orders_df = await run_concurrently(fetch_df(info_gerais, ('0101',), family='history'),
+                                                    fetch_df(quantidade_receber, ('0101',), family='history'))
+
+    Parameters:
+    - query (str): SQL query to execute.
+    - params (tuple, optional): Parameters for the SQL query.
+    - family (str, optional): Query family, see download.
+    - backend (str, optional): Fetch backend, see download.
+
+    Returns:
+    - DataFrame: The query result.
+    """
+    from database_functions.funcoes_base import download
+    return await run_in_worker(download, query, params, backend=backend, family=family)
+
+
+async def run_concurrently(*awaitables):
+    """
+    Await several fetches at once. When one fails, the others are cancelled and the error is raised.
+
+    Parameters:
+    - *awaitables: Coroutines such as fetch_df calls.
+
+    Returns:
+    - list: The results, in the order of the awaitables.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def run_sync(awaitable):
+    """
+    Drive a coroutine to completion from blocking code, such as a pipeline running in a DownloadThread.
+
+    Parameters:
+    - awaitable: The coroutine.
+
+    Returns:
+    - The result of the coroutine.
+    """
+    return asyncio.run(awaitable)
+
+
+def concurrent_calls(*calls):
+    """
+    Run several blocking data access calls at once from blocking code.
+
+    Usage:
+        sales_df, orders_df = concurrent_calls(functools.partial(get_data, '0101', 12, 1),
+                                               functools.partial(get_data, '0101', 12, 0))
+
+    Parameters:
+    - *calls: Callables without arguments, such as functools.partial objects.
+
+    Returns:
+    - list: The results, in the order of the calls.
+    """
+    async def gather_calls():
+        return await run_concurrently(*(run_in_worker(call) for call in calls))
+
+    return run_sync(gather_calls())
+
+
+def install_qt_loop(app):
+    """
+    Let the Qt event loop drive asyncio when the optional qasync package is installed, so coroutines such
+    as fetch_df can be awaited from the GUI thread.
+
+    Parameters:
+    - app (QApplication): The application.
+
+    Returns:
+    - QEventLoop: The installed loop, or None if qasync is not installed.
+    """
+    try:
+        import qasync
+    except ImportError:
+        return None
+
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    logger.info("asyncio is driven by the Qt event loop.")
+    return loop
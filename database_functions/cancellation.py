@@ -0,0 +1,128 @@
+import logging
+import threading
+from sqlalchemy import event
+from database_functions.errors import QueryCancelled
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# Driver cursors executing or being fetched, per thread ident
+_active_cursors = {}
+
+# Threads whose work was cancelled, their next queries fail at once
+_cancelled_threads = set()
+
+# Worker threads running queries on behalf of another thread, per parent thread ident
+_child_threads = {}
+
+_lock = threading.Lock()
+
+
+def register_cursor(cursor):
+    """
+    Record a driver cursor of the current thread so cancel_active_queries can reach it.
+
+    Parameters:
+    - cursor: The DBAPI (pyodbc) cursor about to execute a query.
+    """
+    with _lock:
+        _active_cursors.setdefault(threading.get_ident(), []).append(cursor)
+
+
+def release_cursors():
+    """Forget the cursors of the current thread once its query is done."""
+    with _lock:
+        _active_cursors.pop(threading.get_ident(), None)
+
+
+def adopt_thread(parent_ident):
+    """
+    Link the current worker thread to the thread it runs queries for, so cancelling the parent
+    cancels the worker too. A cancelled parent cancels the worker at once.
+
+    Parameters:
+    - parent_ident (int): Ident of the thread the work is done for.
+    """
+    ident = threading.get_ident()
+    with _lock:
+        _child_threads.setdefault(parent_ident, set()).add(ident)
+        if parent_ident in _cancelled_threads:
+            _cancelled_threads.add(ident)
+        else:
+            _cancelled_threads.discard(ident)
+
+
+def release_thread(parent_ident):
+    """
+    Unlink the current worker thread from its parent once its work is done.
+
+    Parameters:
+    - parent_ident (int): Ident of the thread the work was done for.
+    """
+    ident = threading.get_ident()
+    with _lock:
+        children = _child_threads.get(parent_ident)
+        if children is not None:
+            children.discard(ident)
+            if not children:
+                del _child_threads[parent_ident]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    register_cursor(cursor)
+
+
+def watch_cursors(engine):
+    """
+    Register every cursor executed through an engine, once.
+
+    Parameters:
+    - engine (Engine): The SQLAlchemy engine.
+    """
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+def cancel_active_queries(thread_ident):
+    """
+    Cancel the queries of a thread at the driver level.
+
+    Cursor.cancel sends SQLCancel, so the server stops the statement and the waiting execute or fetch
+    raises in the worker thread. Later queries of the thread fail at once until clear_cancelled is called.
+    Worker threads linked to it with adopt_thread are cancelled too.
+
+    Parameters:
+    - thread_ident (int): Ident of the thread running the queries.
+
+    Returns:
+    - int: Number of cursors cancelled.
+    """
+    with _lock:
+        idents = {thread_ident} | _child_threads.get(thread_ident, set())
+        _cancelled_threads.update(idents)
+        cursors = [cursor for ident in idents for cursor in _active_cursors.get(ident, [])]
+
+    cancelled = 0
+    for cursor in cursors:
+        try:
+            cursor.cancel()
+            cancelled += 1
+        except Exception as e:
+            logger.error(f"Could not cancel a query: {e}")
+
+    logger.info(f"Cancelled {cancelled} running queries of thread {thread_ident}.")
+    return cancelled
+
+
+def check_cancelled():
+    """Raise QueryCancelled if the work of the current thread was cancelled."""
+    with _lock:
+        cancelled = threading.get_ident() in _cancelled_threads
+    if cancelled:
+        raise QueryCancelled("The query was cancelled.")
+
+
+def clear_cancelled():
+    """Let the current thread run queries again, called when it starts new work."""
+    with _lock:
+        _cancelled_threads.discard(threading.get_ident())
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+import pandas as pd
+from database_functions.funcoes_base import download
+from database_functions.params_update import save_frame_locally, load_frame_locally
+from database_functions.queries import catalogo_colunas, dicionario_sx3
+from database_functions.errors import DatabaseError
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# Local store of the column catalog of every table looked up so far
+CATALOG_FILE = "catalogo.pkl"
+
+# Days before the columns of a table are read again from the database
+CATALOG_MAX_AGE = 7
+
+# Character columns up to this length hold codes such as branch, type or warehouse and are exported as categories
+CATEGORY_MAX_LENGTH = 6
+
+# Character SQL types
+CHARACTER_TYPES = ('char', 'varchar', 'nchar', 'nvarchar')
+
+# Integer SQL types and the pandas dtype they are exported as
+INTEGER_DTYPES = {'tinyint': 'Int16', 'smallint': 'Int16', 'int': 'Int32', 'bigint': 'Int64'}
+
+# Serializes updates of the catalog store
+_catalog_lock = threading.Lock()
+
+
+def fetch_table_catalog(table):
+    """
+    Read the columns of a table from INFORMATION_SCHEMA.COLUMNS, with the SX3 titles and descriptions
+    when the Protheus dictionary is stored in the database.
+
+    Parameters:
+    - table (str): The table name.
+
+    Returns:
+    - DataFrame: One row per column, in table order. Empty if the table does not exist.
+    """
+    columns_df = download(catalogo_colunas, (table,), family='lookup', use_cache=False)
+    columns_df['TABLE_NAME'] = table
+
+    try:
+        sx3_df = download(dicionario_sx3, (table[:3],), family='lookup', use_cache=False)
+        sx3_df['X3_CAMPO'] = sx3_df['X3_CAMPO'].str.strip()
+        for column in ['X3_TIPO', 'X3_TITULO', 'X3_DESCRIC']:
+            sx3_df[column] = sx3_df[column].str.strip()
+        columns_df = columns_df.merge(sx3_df, left_on='COLUMN_NAME', right_on='X3_CAMPO', how='left')
+        columns_df = columns_df.drop(columns='X3_CAMPO')
+    except DatabaseError as e:
+        logger.error(f"SX3 descriptions are not available for {table}: {e}")
+        for column in ['X3_TIPO', 'X3_TITULO', 'X3_DESCRIC']:
+            columns_df[column] = None
+
+    columns_df['LOADED_AT'] = time.time()
+    return columns_df
+
+
+def table_catalog(table, refresh=False):
+    """
+    Get the columns of a table from the local catalog, reading them from the database the first time,
+    when they are older than CATALOG_MAX_AGE days, or when a refresh is requested.
+
+    Parameters:
+    - table (str): The table name.
+    - refresh (bool, optional): Read the columns from the database even if they are cached.
+
+    Returns:
+    - DataFrame: COLUMN_NAME, DATA_TYPE, LENGTH, PRECISION, SCALE, ORDINAL_POSITION, X3_TIPO, X3_TITULO and
+      X3_DESCRIC of every column, in table order. Empty if the table does not exist.
+    """
+    table = table.upper()
+    catalog_df = load_frame_locally(CATALOG_FILE, cached=True)
+
+    if catalog_df is not None and not refresh:
+        table_df = catalog_df[catalog_df['TABLE_NAME'] == table]
+        if not table_df.empty and time.time() - table_df['LOADED_AT'].iloc[0] < CATALOG_MAX_AGE * 86400:
+            return table_df.reset_index(drop=True)
+
+    table_df = fetch_table_catalog(table)
+    if table_df.empty:
+        return table_df
+
+    with _catalog_lock:
+        # Replace the columns of the table in the store
+        catalog_df = load_frame_locally(CATALOG_FILE)
+        if catalog_df is not None:
+            table_df = pd.concat([catalog_df[catalog_df['TABLE_NAME'] != table], table_df], ignore_index=True)
+        save_frame_locally(CATALOG_FILE, table_df)
+
+    logger.info(f"Catalog of {table} loaded from the database.")
+    return table_df[table_df['TABLE_NAME'] == table].reset_index(drop=True)
+
+
+def apply_catalog_dtypes(data_frame, table_df):
+    """
+    Convert the columns of a table export to compact dtypes chosen from the catalog: SX3 dates to
+    datetimes, short codes to categories and integers to nullable integers.
+
+    Parameters:
+    - data_frame (DataFrame): Rows fetched from the table.
+    - table_df (DataFrame): Catalog of the table, from table_catalog.
+
+    Returns:
+    - DataFrame: The converted data.
+    """
+    for column in table_df.itertuples(index=False):
+        if column.COLUMN_NAME not in data_frame.columns:
+            continue
+        values = data_frame[column.COLUMN_NAME]
+
+        # Protheus stores dates as YYYYMMDD strings
+        if column.X3_TIPO == 'D':
+            data_frame[column.COLUMN_NAME] = pd.to_datetime(values.str.strip(), format='%Y%m%d', errors='coerce')
+        elif column.DATA_TYPE in INTEGER_DTYPES:
+            data_frame[column.COLUMN_NAME] = values.astype(INTEGER_DTYPES[column.DATA_TYPE])
+        elif column.DATA_TYPE in CHARACTER_TYPES and 0 < (column.LENGTH or 0) <= CATEGORY_MAX_LENGTH:
+            data_frame[column.COLUMN_NAME] = values.astype('category')
+
+    return data_frame
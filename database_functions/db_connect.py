@@ -1,5 +1,5 @@
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 import configparser
 import os
 import sys
@@ -10,27 +10,147 @@ app_path = os.path.abspath(os.path.dirname(sys.argv[0]))
 # Construct the path to the .ini file
 config_path = os.path.join(app_path, 'db_config.ini')
 
-with open(config_path, 'r', encoding='utf-8') as f:
-    config_content = f.read()
-
-config = configparser.ConfigParser()
-config.read_string(config_content)
-
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Parsed db_config.ini, loaded on first use
+_config = None
+
+# Isolation levels a query family can be set to in the [isolation] section of db_config.ini
+ISOLATION_LEVELS = ['READ UNCOMMITTED', 'READ COMMITTED', 'SNAPSHOT']
+
+# Isolation level of each query family when db_config.ini does not set one, None keeping the server default.
+# Dirty reads or snapshot versioning change what a report sees, so they are opted into in the [isolation] section.
+DEFAULT_ISOLATION = {
+    'report': None,
+    'history': None,
+    'export': None,
+    'lookup': None,
+}
+
+# Seconds a query of each family may run before the driver stops it, 0 meaning no limit
+DEFAULT_TIMEOUTS = {
+    'report': 900,
+    'history': 600,
+    'export': 900,
+    'lookup': 60,
+}
+
+
+def load_config():
+    """
+    Read db_config.ini the first time it is needed and reuse it afterwards.
+
+    Returns:
+    - ConfigParser: The parsed configuration.
+    """
+    global _config
+
+    if _config is None:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config_content = f.read()
+
+        config = configparser.ConfigParser()
+        config.read_string(config_content)
+        _config = config
+
+    return _config
+
+
+def session_options(config, family=None):
+    """
+    Resolve the session options of a query family.
+
+    Every family uses the server default isolation level unless db_config.ini sets one, SNAPSHOT
+    requiring ALLOW_SNAPSHOT_ISOLATION on the database:
+
+        [isolation]
+        report = SNAPSHOT
+        history = READ UNCOMMITTED
+
+    Connections declare a read-only application intent, so they can be routed to a readable secondary,
+    only when 'application_intent = ReadOnly' is set in the [sql_server] section.
+
+    Parameters:
+    - config (ConfigParser): The parsed db_config.ini.
+    - family (str, optional): The query family, 'report', 'history', 'export' or 'lookup'.
+
+    Returns:
+    - tuple: (isolation level or None for the server default, True for a read-only intent).
+    """
+    isolation_level = DEFAULT_ISOLATION.get(family)
+    if family and config.has_option('isolation', family):
+        isolation_level = config.get('isolation', family).strip().upper() or None
+
+    if isolation_level is not None and isolation_level not in ISOLATION_LEVELS:
+        logger.error(f"Unsupported isolation level {isolation_level} for {family}, using the server default.")
+        isolation_level = None
+
+    read_only = config.get('sql_server', 'application_intent', fallback='ReadWrite').lower() == 'readonly'
+
+    return isolation_level, read_only
+
+
+def query_timeout(config, family=None):
+    """
+    Resolve the statement timeout of a query family, which can be changed in db_config.ini:
+
+        [timeouts]
+        export = 300
+
+    Parameters:
+    - config (ConfigParser): The parsed db_config.ini.
+    - family (str, optional): The query family, 'report', 'history', 'export' or 'lookup'.
+
+    Returns:
+    - int: Timeout in seconds, 0 for no limit.
+    """
+    default = DEFAULT_TIMEOUTS.get(family, 0)
+    if not family:
+        return default
+    return config.getint('timeouts', family, fallback=default)
+
+
+def config_flag(section, option, value=None, fallback=False):
+    """
+    Resolve an on/off option of a pipeline. An explicit argument wins, otherwise db_config.ini decides:
+
+        [report]
+        pushdown = false
+
+    Parameters:
+    - section (str): Section of db_config.ini.
+    - option (str): Option of the section.
+    - value (bool, optional): The value passed by the caller, None to read db_config.ini.
+    - fallback (bool, optional): The value when db_config.ini does not set the option.
+
+    Returns:
+    - bool: The resolved value.
+    """
+    if value is not None:
+        return value
+    return load_config().getboolean(section, option, fallback=fallback)
+
 
 class Database:
-    def __init__(self, db_config, db_type='sql_server'):
+    def __init__(self, db_config, db_type='sql_server', isolation_level=None, read_only=False, query_timeout=0):
         """
         Initialize the Database object.
         
         Parameters:
         - db_config: Configuration dictionary containing the database parameters
         - db_type (str): The type of the database. Supported values are 'sql_server' and 'mysql'.
+        - isolation_level (str, optional): Transaction isolation level of every session, such as
+          'READ UNCOMMITTED' or 'SNAPSHOT'. Defaults to None, the server default.
+        - read_only (bool, optional): Declare a read-only application intent on SQL Server connections.
+        - query_timeout (int, optional): Seconds a SQL Server statement may run before the driver stops it.
+          Defaults to 0, no limit.
         """
         self.db_type = db_type
         self.connection = None
+        self.isolation_level = isolation_level
+        self.read_only = read_only
+        self.query_timeout = query_timeout
 
         if self.db_type == 'sql_server':
             self.sql_server = db_config['sql_server']['server']
@@ -74,12 +194,41 @@ class Database:
         try:
             connection_string = (f"mssql+pyodbc://{self.sql_username}:{self.sql_password}@"
                                  f"{self.sql_server}/{self.sql_database}?driver=ODBC+Driver+17+for+SQL+Server")
-            self.connection = create_engine(connection_string)
+            if self.read_only:
+                connection_string += "&ApplicationIntent=ReadOnly"
+
+            # The isolation level is applied to every pooled connection when it is opened, and pooled
+            # connections dropped by the server are detected before being used
+            engine_options = {'pool_pre_ping': True}
+            if self.isolation_level:
+                engine_options['isolation_level'] = self.isolation_level
+            self.connection = create_engine(connection_string, **engine_options)
+
+            # pyodbc applies the connection timeout attribute to every statement of the connection
+            if self.query_timeout:
+                @event.listens_for(self.connection, 'connect')
+                def set_query_timeout(dbapi_connection, connection_record):
+                    dbapi_connection.timeout = self.query_timeout
+
             return self.connection
         except Exception as e:
             logger.error(f"An error occurred while connecting to the SQL Server database: {e}")
             return None
 
+    def odbc_connection_string(self):
+        """
+        Build the plain ODBC connection string of the SQL Server database, used by readers that
+        connect through ODBC directly instead of SQLAlchemy.
+
+        Returns:
+        - str: The ODBC connection string.
+        """
+        connection_string = (f"Driver={{ODBC Driver 17 for SQL Server}};Server={self.sql_server};"
+                             f"Database={self.sql_database};UID={self.sql_username};PWD={self.sql_password}")
+        if self.read_only:
+            connection_string += ";ApplicationIntent=ReadOnly"
+        return connection_string
+
     def connect_mysql(self):
         """
         Establish a connection to a MySQL database.
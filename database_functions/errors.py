@@ -0,0 +1,26 @@
+class DatabaseError(Exception):
+    """Base class of the errors raised by download."""
+
+
+class ConnectionFailure(DatabaseError):
+    """The database could not be reached, or the connection was lost, after every retry."""
+
+
+class QueryError(DatabaseError):
+    """The database rejected the query, retrying it would fail the same way."""
+
+
+class CircuitOpenError(ConnectionFailure):
+    """Recent connection failures opened the circuit breaker, the query was not sent."""
+
+
+class QueryTimeout(DatabaseError):
+    """The query ran longer than the timeout of its family and was stopped by the driver."""
+
+
+class QueryCancelled(DatabaseError):
+    """The query was cancelled by the user."""
+
+
+class InvalidIdentifier(QueryError):
+    """A table or column name is not in the schema catalog, the query was not sent."""
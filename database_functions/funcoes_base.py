@@ -1,68 +1,444 @@
 import pandas as pd
+import numpy as np
 import logging
 import os
+import time
+import decimal
 import datetime
-from database_functions.db_connect import Database, config
-from openpyxl import load_workbook
+import threading
+from database_functions.db_connect import Database, load_config, session_options, query_timeout
+from openpyxl import load_workbook, Workbook
 from main_functions.fetch_params import merge_sheets
+from database_functions.timing import timed, span
+from database_functions.errors import ConnectionFailure
+from database_functions.resilience import call_with_retry
+from database_functions.cancellation import watch_cursors, register_cursor, release_cursors, check_cancelled
+from database_functions.result_cache import (parquet_available, cache_ttl, cache_key, load_cached_result, store_result,
+                                             DEFAULT_MAX_SIZE_MB)
+from database_functions.query_profiler import (profiling_enabled, attach_profiler, start_query, mark_first_row,
+                                               finish_query)
 
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Fetch backends understood by download
+FETCH_BACKENDS = ['pandas', 'batched', 'arrow']
 
-def download(query, params=None):
+# Rows requested from the driver per fetchmany call by the batched and arrow backends
+FETCH_BATCH_SIZE = 10000
+
+# One engine, and its connection pool, per query family, created by database_for
+_databases = {}
+_databases_lock = threading.Lock()
+
+# Where result files are written and whether they are opened, changed by configure_output
+output_settings = {'folder': None, 'open_files': True}
+
+
+def configure_output(folder=None, open_files=True):
+    """
+    Change where result files are written and whether they are opened after saving.
+
+    Parameters:
+    - folder (str, optional): Folder for the result files. Defaults to None, the 'Resultado' folder on the Desktop.
+    - open_files (bool, optional): If False, result files are never opened. Defaults to True.
+    """
+    output_settings['folder'] = folder
+    output_settings['open_files'] = open_files
+
+
+def fetch_backend(config, backend=None):
+    """
+    Pick the fetch backend used by download.
+
+    Parameters:
+    - config (ConfigParser): The parsed db_config.ini, read for the [fetch] backend option.
+    - backend (str, optional): Backend requested by the caller, overriding the configuration.
+
+    Returns:
+    - str: 'pandas', 'batched' or 'arrow'.
+    """
+    backend = backend or config.get('fetch', 'backend', fallback='pandas')
+
+    if backend == 'arrow' and not arrow_odbc_available():
+        logger.error("arrow-odbc is not installed, using the batched fetch backend.")
+        return 'batched'
+    if backend not in FETCH_BACKENDS:
+        logger.error(f"Unknown fetch backend {backend}, using pandas.")
+        return 'pandas'
+
+    return backend
+
+
+def arrow_odbc_available():
+    """Check whether the optional arrow-odbc reader can be imported."""
+    try:
+        import arrow_odbc  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def column_values(values):
+    """
+    Turn the values of one result column into a pandas column, converting Decimal to float like read_sql does.
+
+    Parameters:
+    - values (list): Values of the column, in row order.
+
+    Returns:
+    - Series: The column with an inferred dtype.
+    """
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, decimal.Decimal):
+        return pd.Series(array.astype(float))
+
+    return pd.Series(array).infer_objects()
+
+
+def fetch_batched(engine, query, params=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Fetch a query through the raw driver cursor in large batches and build the columns directly.
+
+    Parameters:
+    - engine (Engine): The SQLAlchemy engine.
+    - query (str): SQL query to execute.
+    - params (tuple, optional): Parameters for the SQL query.
+    - batch_size (int, optional): Rows per fetchmany call, also used as the cursor arraysize.
+
+    Returns:
+    - DataFrame: The query result.
+    """
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.arraysize = batch_size
+        register_cursor(cursor)
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        mark_first_row()
+
+        names = [description[0] for description in cursor.description]
+        columns = [[] for _ in names]
+
+        # Transpose each batch of rows into the column lists
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for column, values in zip(columns, zip(*rows)):
+                column.extend(values)
+
+        cursor.close()
+    finally:
+        raw_connection.close()
+
+    data_frame = pd.DataFrame({position: column_values(values) for position, values in enumerate(columns)})
+    data_frame.columns = names
+    return data_frame
+
+
+def fetch_arrow(db_instance, query, params=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Fetch a query with the optional arrow-odbc reader, which fills Arrow buffers in the driver.
+    The reader opens its own ODBC connection, with the read-only intent and statement timeout but the
+    server default isolation, and cannot be cancelled.
+
+    Parameters:
+    - db_instance (Database): Database holding the connection parameters.
+    - query (str): SQL query to execute.
+    - params (tuple, optional): Parameters for the SQL query.
+    - batch_size (int, optional): Rows per Arrow record batch.
+
+    Returns:
+    - DataFrame: The query result.
+    """
+    import pyarrow as pa
+    from arrow_odbc import read_arrow_batches_from_odbc
+
+    reader = read_arrow_batches_from_odbc(
+        query=query,
+        connection_string=db_instance.odbc_connection_string(),
+        batch_size=batch_size,
+        query_timeout_sec=db_instance.query_timeout or None,
+        parameters=[None if value is None else str(value) for value in params] if params else None,
+    )
+    mark_first_row()
+
+    return pa.Table.from_batches(list(reader), schema=reader.schema).to_pandas()
+
+
+def database_for(family=None):
+    """
+    Get the Database of a query family, with the isolation level, application intent and statement
+    timeout of the family.
+
+    The engine is created on first use and kept, so the queries of a family share its connection pool.
+
+    Parameters:
+    - family (str, optional): The query family, 'report', 'history', 'export' or 'lookup'.
+
+    Returns:
+    - tuple: (Database, Engine).
+    """
+    with _databases_lock:
+        if family not in _databases:
+            config = load_config()
+            isolation_level, read_only = session_options(config, family)
+            timeout = query_timeout(config, family)
+            db_instance = Database(db_config=config, db_type='sql_server', isolation_level=isolation_level,
+                                   read_only=read_only, query_timeout=timeout)
+            engine = db_instance.connect()
+            if engine is None:
+                return db_instance, None
+            # Running cursors are recorded so the user can cancel them
+            watch_cursors(engine)
+            logger.info(f"Engine for {family or 'default'} queries: isolation {isolation_level or 'default'}, "
+                        f"read-only intent {read_only}, timeout {timeout or 'none'}.")
+            _databases[family] = (db_instance, engine)
+
+        return _databases[family]
+
+
+@timed()
+def download(query, params=None, backend=None, family=None, use_cache=True):
     """
     Downloads data from the database using a specified SQL query.
 
     Parameters:
     - query (str): SQL query to execute.
     - params (dict, optional): Parameter for the SQL query.
+    - backend (str, optional): 'pandas' (pd.read_sql), 'batched' (cursor fetchmany) or 'arrow' (arrow-odbc).
+      Defaults to the [fetch] backend option of db_config.ini, or 'pandas'.
+    - family (str, optional): Query family selecting the session isolation level and statement timeout,
+      see session_options and query_timeout.
+    - use_cache (bool, optional): Reuse a result of the same query and parameters younger than the TTL of
+      the family, see cache_ttl. False always queries the database. Defaults to True.
 
     Returns:
-    - DataFrame: DataFrame containing the results or None if an error occurred.
+    - DataFrame: DataFrame containing the results.
+
+    Raises:
+    - CircuitOpenError: If recent connection failures opened the circuit breaker, without querying.
+    - ConnectionFailure: If the database could not be reached after every retry.
+    - QueryTimeout: If the query ran longer than the timeout of its family.
+    - QueryCancelled: If the work of the calling thread was cancelled with cancel_active_queries.
+    - QueryError: If the database rejected the query.
     """
-    # Create an instance of the Database class and establish a connection.
-    db_instance = Database(db_config=config, db_type='sql_server')
-    db = db_instance.connect()
+    config = load_config()
+
+    # Results of identical queries are reused within the TTL of their family, without reaching the network
+    ttl = cache_ttl(config, family) if use_cache and parquet_available() else 0
+    if ttl:
+        key = cache_key(query, params)
+        data_frame = load_cached_result(key, ttl)
+        if data_frame is not None:
+            logger.info(f"download served from the result cache ({family} query, data as of "
+                        f"{data_frame.attrs['data_as_of']:%Y-%m-%d %H:%M})")
+            return data_frame
+
+    # Get the Database of the query family and its engine.
+    db_instance, db = database_for(family)
+    if db is None:
+        raise ConnectionFailure("Could not create the database engine.")
+    backend = fetch_backend(config, backend)
+
+    # Opt-in per-query profiling, stored in a local SQLite file
+    profiling = profiling_enabled(config)
+    if profiling and backend == 'pandas':
+        attach_profiler(db)
+
+    def fetch():
+        # Stop at once when the user cancelled the work of this thread
+        check_cancelled()
+
+        if profiling and backend != 'pandas':
+            start_query(query, params)
 
-    try:
         # Execute the SQL query and store the result in a DataFrame.
-        if params:
-            data_frame = pd.read_sql(query, db, params=params)
+        if backend == 'batched':
+            return fetch_batched(db, query, params)
+        elif backend == 'arrow':
+            return fetch_arrow(db_instance, query, params)
+        elif params:
+            return pd.read_sql(query, db, params=params)
         else:
-            data_frame = pd.read_sql(query, db)
-        logger.info("download was successful")
+            return pd.read_sql(query, db)
+
+    # Every query is a read, so connection failures and deadlocks are retried
+    try:
+        data_frame = call_with_retry(fetch, description=f"{family or 'default'} query")
     except Exception as e:
         logger.error(f"An error occurred: {e}")
-        data_frame = None
+        raise
+    finally:
+        release_cursors()
+
+    logger.info("download was successful")
+    if profiling:
+        finish_query(data_frame)
+    if ttl:
+        store_result(key, data_frame, config.getint('cache', 'max_size_mb', fallback=DEFAULT_MAX_SIZE_MB))
 
     return data_frame
 
 
-def save_to_excel(data_frame, filename_prefix, filial, open_file=False):
+def download_chunks(query, params=None, family=None, chunksize=FETCH_BATCH_SIZE):
     """
-    Saves a DataFrame to an Excel file on the user's Desktop in a folder named 'Resultado'.
-    
+    Stream the result of a query as DataFrames of at most chunksize rows, so only one chunk is held in
+    memory and the caller can write the first rows before the query finishes.
+
+    Opening the query and fetching the first chunk are retried like download. Once rows were handed to
+    the caller they cannot be fetched again, so a failure while streaming is raised without a retry.
+    Results are never cached.
+
+    Usage:
+        for chunk in download_chunks(faturamento, (date_fat, filial), family='export'):
+            writer.append(transform(chunk))
+
+    Parameters:
+    - query (str): SQL query to execute.
+    - params (tuple, optional): Parameters for the SQL query.
+    - family (str, optional): Query family, see download.
+    - chunksize (int, optional): Rows per chunk. Defaults to FETCH_BATCH_SIZE.
+
+    Yields:
+    - DataFrame: The next rows of the result. An empty result yields one empty frame with the columns.
+
+    Raises:
+    - The same errors as download.
+    """
+    db_instance, db = database_for(family)
+    if db is None:
+        raise ConnectionFailure("Could not create the database engine.")
+    description = f"{family or 'default'} query"
+
+    def first_chunk():
+        # Stop at once when the user cancelled the work of this thread
+        check_cancelled()
+
+        connection = db.connect()
+        try:
+            chunks = pd.read_sql(query, connection, params=params, chunksize=chunksize)
+            return connection, chunks, next(chunks, None)
+        except Exception:
+            connection.close()
+            raise
+
+    try:
+        connection, chunks, chunk = call_with_retry(first_chunk, description=description)
+        rows = 0
+        try:
+            while chunk is not None:
+                rows += len(chunk)
+                yield chunk
+
+                check_cancelled()
+                chunk = call_with_retry(lambda: next(chunks, None), description=description, attempts=1)
+        finally:
+            connection.close()
+        logger.info(f"download_chunks streamed {rows} rows")
+    finally:
+        release_cursors()
+
+
+def benchmark_fetch(query, params=None, backends=FETCH_BACKENDS, repeat=3, family=None):
+    """
+    Time the fetch backends against each other on the same query.
+
+    Parameters:
+    - query (str): SQL query to execute.
+    - params (tuple, optional): Parameters for the SQL query.
+    - backends (list, optional): Backends to compare. Defaults to all of them.
+    - repeat (int, optional): Runs per backend, the best one is kept. Defaults to 3.
+    - family (str, optional): Query family the query belongs to.
+
+    Returns:
+    - dict: Backend mapped to a (best time in seconds, row count) tuple.
+    """
+    results = {}
+    for backend in backends:
+        if backend == 'arrow' and not arrow_odbc_available():
+            continue
+
+        best = None
+        rows = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data_frame = download(query, params, backend=backend, family=family, use_cache=False)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+            rows = len(data_frame)
+
+        results[backend] = (best, rows)
+        logger.info(f"Fetch benchmark: {backend} took {best:.2f}s for {rows} rows.")
+
+    return results
+
+
+def result_file_path(filename_prefix, filial):
+    """
+    Builds the path of a result file on the user's Desktop in a folder named 'Resultado',
+    or in the folder set with configure_output.
+
     Parameters:
-    - data_frame (DataFrame): The data to save.
     - filename_prefix (str): Prefix for the Excel filename.
     - filial (str): Additional information for the Excel filename.
-    - open_file (bool, optional): If True, the Excel file will be opened. Defaults to False.
 
     Returns:
-    - str: Path to the saved Excel file. If open_file is True, also returns the workbook and sheet objects.
+    - str: Path to the Excel file.
     """
-    # Determine the path to the user's Desktop.
-    desktop = os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop')
+    result_folder = output_settings['folder']
+    if result_folder is None:
+        # Determine the path to the user's Desktop.
+        desktop = os.path.join(os.path.join(os.environ['USERPROFILE']), 'Desktop')
+        result_folder = os.path.join(desktop, 'Resultado')
 
-    # Ensure the 'Resultado' folder exists on the Desktop.
-    result_folder = os.path.join(desktop, 'Resultado')
+    # Ensure the result folder exists.
     if not os.path.exists(result_folder):
         os.makedirs(result_folder)
 
     # Determine the path for the Excel file inside 'Resultado' folder.
     current_timestamp = datetime.datetime.now().strftime('%Y%m%d')
-    excel_file_path = os.path.join(result_folder, f'{filename_prefix}_{filial}_{current_timestamp}.xlsx')
+    return os.path.join(result_folder, f'{filename_prefix}_{filial}_{current_timestamp}.xlsx')
+
+
+def open_result_file(excel_file_path):
+    """
+    Opens a result file with the default application, logging any failure.
+
+    Parameters:
+    - excel_file_path (str): Path to the file to open.
+    """
+    if not output_settings['open_files']:
+        return
+
+    try:
+        os.startfile(excel_file_path)
+    except Exception as e:
+        logger.error(f"Could not open the file: {e}")
+
+
+@timed()
+def save_to_excel(data_frame, filename_prefix, filial, open_file=False):
+    """
+    Saves a DataFrame to an Excel file on the user's Desktop in a folder named 'Resultado'.
+    
+    Parameters:
+    - data_frame (DataFrame): The data to save.
+    - filename_prefix (str): Prefix for the Excel filename.
+    - filial (str): Additional information for the Excel filename.
+    - open_file (bool, optional): If True, the Excel file will be opened. Defaults to False.
+
+    Returns:
+    - str: Path to the saved Excel file. If open_file is True, also returns the workbook and sheet objects.
+    """
+    excel_file_path = result_file_path(filename_prefix, filial)
 
     # Write the DataFrame to an Excel file.
     logger.info(f"Writing data to {excel_file_path}.")
@@ -71,9 +447,133 @@ def save_to_excel(data_frame, filename_prefix, filial, open_file=False):
 
     # If open_file is True, open the Excel file and return workbook and sheet objects.
     if open_file:
-        try:
-            os.startfile(excel_file_path)
-        except Exception as e:
-            logger.error(f"Could not open the file: {e}")
+        open_result_file(excel_file_path)
 
     return excel_file_path
+
+
+class BranchWorkbook:
+    """
+    Consolidated Excel output with one sheet per branch.
+
+    The workbook is created in openpyxl's write-only mode, so every sheet is streamed to disk
+    row by row as it is written. The caller can drop each branch DataFrame right after
+    writing it and a single writer instance is reused for the whole run.
+
+    Usage:
+        with BranchWorkbook('pedidos', 'Todas') as workbook:
+            for filial in branches:
+                workbook.write_sheet(build_frame(filial), filial)
+    """
+
+    def __init__(self, filename_prefix, filial, open_file=False):
+        """
+        Parameters:
+        - filename_prefix (str): Prefix for the Excel filename.
+        - filial (str): Additional information for the Excel filename.
+        - open_file (bool, optional): If True, the workbook is opened once it is closed. Defaults to False.
+        """
+        self.path = result_file_path(filename_prefix, filial)
+        self.open_file = open_file
+        self.workbook = Workbook(write_only=True)
+        self.sheet_count = 0
+
+    def write_sheet(self, data_frame, sheet_name):
+        """
+        Streams a DataFrame into a new sheet of the workbook.
+
+        Parameters:
+        - data_frame (DataFrame): The data to write.
+        - sheet_name (str): Name of the new sheet, usually the branch code.
+        """
+        logger.info(f"Writing sheet {sheet_name} to {self.path}.")
+        with span('write_sheet', filial=str(sheet_name), rows=len(data_frame)):
+            sheet = self.workbook.create_sheet(title=str(sheet_name)[:31])
+            sheet.append([str(column) for column in data_frame.columns])
+            self.append_rows(sheet, data_frame)
+        self.sheet_count += 1
+
+    def write_chunks(self, chunks, sheet_name):
+        """
+        Streams DataFrame chunks with the same columns into a new sheet, each chunk being appended as it
+        arrives so only one chunk is held in memory.
+
+        Parameters:
+        - chunks (iterable): The DataFrames, such as the chunks of download_chunks.
+        - sheet_name (str): Name of the new sheet, usually the branch code.
+
+        Returns:
+        - int: Number of rows written.
+        """
+        logger.info(f"Streaming sheet {sheet_name} to {self.path}.")
+        rows = 0
+        with span('write_sheet', filial=str(sheet_name)):
+            sheet = self.workbook.create_sheet(title=str(sheet_name)[:31])
+            self.sheet_count += 1
+            for position, data_frame in enumerate(chunks):
+                if position == 0:
+                    sheet.append([str(column) for column in data_frame.columns])
+                self.append_rows(sheet, data_frame)
+                rows += len(data_frame)
+        return rows
+
+    @staticmethod
+    def append_rows(sheet, data_frame):
+        """
+        Appends the rows of a DataFrame to a write-only sheet, missing values becoming empty cells.
+
+        Parameters:
+        - sheet (WriteOnlyWorksheet): The sheet.
+        - data_frame (DataFrame): The rows to append.
+        """
+        # Replace the missing values of the whole frame once instead of testing every cell
+        cells = data_frame.astype(object).where(data_frame.notna(), None)
+        for row in cells.itertuples(index=False, name=None):
+            sheet.append(list(row))
+
+    def close(self):
+        """
+        Writes the workbook to disk and optionally opens it.
+
+        Returns:
+        - str: Path to the saved Excel file, or None if no sheet was written.
+        """
+        if self.sheet_count == 0:
+            logger.error(f"No sheets were written, {self.path} was not created.")
+            return None
+
+        with span('save_workbook', sheets=self.sheet_count):
+            self.workbook.save(self.path)
+        logger.info(f"Saved {self.sheet_count} sheets to {self.path} successfully.")
+
+        if self.open_file:
+            open_result_file(self.path)
+
+        return self.path
+
+    def discard(self):
+        """
+        Drops the workbook without writing it, so a failed export never leaves a truncated file
+        under the final name.
+        """
+        logger.error(f"The export failed after {self.sheet_count} sheets, {self.path} was not saved.")
+
+        # Finish the streamed sheets so their temporary files are closed, openpyxl removes them at exit
+        for sheet in self.workbook.worksheets:
+            try:
+                sheet.close()
+            except Exception as e:
+                logger.error(f"Could not close the sheet {sheet.title}: {e}")
+        self.workbook = Workbook(write_only=True)
+        self.sheet_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Only a complete export is saved
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+        return False
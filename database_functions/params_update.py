@@ -6,6 +6,9 @@ import shutil
 
 logger = logging.getLogger(__name__)
 
+# In-memory copies of the local stores, keyed by path and reused while the file is unchanged
+_frame_cache = {}
+
 
 def is_network_reachable(network_name="CENTRO OESTE"):
     try:
@@ -46,4 +49,68 @@ def save_excel_locally(file_name, data=None, local_folder="params", shared_folde
         except Exception as e:
             logger.error(f"An error occurred while copying the file: {e}")
     elif not shared_folder_path and data is None:
-        logger.error("No shared folder path provided and no DataFrame to save.")
\ No newline at end of file
+        logger.error("No shared folder path provided and no DataFrame to save.")
+
+
+def save_frame_locally(file_name, data_frame, local_folder="params"):
+    """
+    Save a DataFrame to a local pickle store, which loads much faster than an Excel workbook.
+
+    Parameters:
+    - file_name (str): Name of the store file inside the local folder.
+    - data_frame (DataFrame): The data to save.
+    - local_folder (str, optional): Folder where the store is kept. Defaults to 'params'.
+
+    Returns:
+    - str: Path to the saved store, or None if an error occurred.
+    """
+    # Ensure the local folder exists
+    if not os.path.exists(local_folder):
+        os.makedirs(local_folder)
+
+    local_file_path = os.path.join(local_folder, file_name)
+
+    try:
+        # Write to a temporary file first so readers never see a half written store
+        temp_file_path = local_file_path + ".tmp"
+        data_frame.to_pickle(temp_file_path)
+        os.replace(temp_file_path, local_file_path)
+        logger.info(f"DataFrame stored in {local_file_path}")
+        return local_file_path
+    except Exception as e:
+        logger.error(f"An error occurred while storing the DataFrame: {e}")
+        return None
+
+
+def load_frame_locally(file_name, local_folder="params", cached=False):
+    """
+    Load a DataFrame previously saved with save_frame_locally.
+
+    Parameters:
+    - file_name (str): Name of the store file inside the local folder.
+    - local_folder (str, optional): Folder where the store is kept. Defaults to 'params'.
+    - cached (bool, optional): If True, keep the loaded data in memory and reuse it until the store file
+      changes. Callers must not modify the returned DataFrame. Defaults to False.
+
+    Returns:
+    - DataFrame: The stored data, or None if the store does not exist or cannot be read.
+    """
+    local_file_path = os.path.join(local_folder, file_name)
+
+    if not os.path.exists(local_file_path):
+        return None
+
+    mtime = os.path.getmtime(local_file_path)
+    if cached and local_file_path in _frame_cache and _frame_cache[local_file_path][0] == mtime:
+        return _frame_cache[local_file_path][1]
+
+    try:
+        data_frame = pd.read_pickle(local_file_path)
+    except Exception as e:
+        logger.error(f"An error occurred while loading {local_file_path}: {e}")
+        return None
+
+    if cached:
+        _frame_cache[local_file_path] = (mtime, data_frame)
+
+    return data_frame
@@ -118,10 +118,26 @@ historico_faturamento = """
                 WHERE
                 SD2.D_E_L_E_T_ <> '*'
                 AND SD2.D2_FILIAL = ?
-                AND SD2.D2_EMISSAO >= CONVERT(VARCHAR, DATEADD(MONTH, -4, GETDATE()), 112)
+                AND SD2.D2_EMISSAO >= CONVERT(VARCHAR, DATEADD(MONTH, ?, GETDATE()), 112)
                 ORDER BY
                 SD2.D2_EMISSAO
         """
+historico_faturamento_mensal = """
+        SELECT
+                SB.B1_ZGRUPO,
+                SD2.D2_FILIAL,
+                LEFT(SD2.D2_EMISSAO, 6) AS ANO_MES,
+                SUM(SD2.D2_QUANT) AS D2_QUANT
+                FROM
+                SD2010 AS SD2
+                INNER JOIN SB1010 AS SB ON SD2.D2_COD = SB.B1_COD AND SB.D_E_L_E_T_ <> '*' 
+                WHERE
+                SD2.D_E_L_E_T_ <> '*'
+                AND SD2.D2_FILIAL = ?
+                AND SD2.D2_EMISSAO >= CONVERT(VARCHAR, DATEADD(MONTH, ?, GETDATE()), 112)
+                GROUP BY
+                SB.B1_ZGRUPO, SD2.D2_FILIAL, LEFT(SD2.D2_EMISSAO, 6)
+        """
 quantidade_receber = """
         SELECT
 SC7.C7_FILIAL,
@@ -186,6 +202,93 @@ P.B1_COD = ?
 AND S.B2_LOCAL = 'A01'
 """
 
+# Sales TES codes considered by the inventory analysis report
+report_tes = """('502','504','525','650','650','533','534','535','536','537','538','539','540','541','542','543','544','564','609','610','612','613','615',
+'617','618','620','621','625','626','627','629','632','635','636','640','648','650','660','662','664','665','668','669','672','673','678','759','765','766','767','768',
+'769','777','778','872','785','795','796','816','891','588','589','611','614','616','631','634','661','661','663','667','686','804',
+'503','523','524','529','530','531','532','642','657','866','867','868','869','692','799','807','819','876','877','882','883','903', '688', '817','574', '622', '623')"""
+relatorio_vendas_agregado = f"""
+        SELECT
+SB.B1_ZGRUPO,
+COUNT(*) AS sales_period_count,
+SUM(SD2.D2_QUANT) AS demand_period_sum
+FROM SD2010 AS SD2
+INNER JOIN
+SB1010 AS SB ON SD2.D2_COD = SB.B1_COD AND SB.D_E_L_E_T_ <> '*' 
+WHERE SD2.D_E_L_E_T_  <> '*'
+AND SD2.D2_FILIAL = ?
+AND SD2.D2_EMISSAO > CONVERT(VARCHAR, DATEADD(DAY, ?, GETDATE()), 112)
+AND SD2.D2_TES IN {report_tes}
+GROUP BY SB.B1_ZGRUPO
+        """
+relatorio_pedidos_agregado = """
+        SELECT
+SB.B1_ZGRUPO,
+SUM(SC7.C7_PRECO) AS cost_period_sum,
+COUNT(*) AS cost_period_size
+FROM SC7010 AS SC7
+INNER JOIN
+    SB1010 AS SB ON TRIM(SC7.C7_PRODUTO) = TRIM(SB.B1_COD) AND SB.D_E_L_E_T_ <> '*'
+WHERE SC7.D_E_L_E_T_ <> '*' 
+AND SC7.C7_FILIAL = ?
+AND SC7.C7_EMISSAO > CONVERT(VARCHAR, DATEADD(DAY, ?, GETDATE()), 112)
+GROUP BY SB.B1_ZGRUPO
+        """
+relatorio_vendas_diario = f"""
+        SELECT
+SB.B1_ZGRUPO,
+SD2.D2_EMISSAO AS EMISSAO,
+COUNT(*) AS sales_period_count,
+SUM(SD2.D2_QUANT) AS demand_period_sum
+FROM SD2010 AS SD2
+INNER JOIN
+SB1010 AS SB ON SD2.D2_COD = SB.B1_COD AND SB.D_E_L_E_T_ <> '*' 
+WHERE SD2.D_E_L_E_T_  <> '*'
+AND SD2.D2_FILIAL = ?
+AND SD2.D2_EMISSAO > CONVERT(VARCHAR, DATEADD(DAY, ?, GETDATE()), 112)
+AND SD2.D2_TES IN {report_tes}
+GROUP BY SB.B1_ZGRUPO, SD2.D2_EMISSAO
+        """
+relatorio_pedidos_diario = """
+        SELECT
+SB.B1_ZGRUPO,
+SC7.C7_EMISSAO AS EMISSAO,
+SUM(SC7.C7_PRECO) AS cost_period_sum,
+COUNT(*) AS cost_period_size
+FROM SC7010 AS SC7
+INNER JOIN
+    SB1010 AS SB ON TRIM(SC7.C7_PRODUTO) = TRIM(SB.B1_COD) AND SB.D_E_L_E_T_ <> '*'
+WHERE SC7.D_E_L_E_T_ <> '*' 
+AND SC7.C7_FILIAL = ?
+AND SC7.C7_EMISSAO > CONVERT(VARCHAR, DATEADD(DAY, ?, GETDATE()), 112)
+GROUP BY SB.B1_ZGRUPO, SC7.C7_EMISSAO
+        """
+
+
+catalogo_colunas = """
+        SELECT
+COLUMN_NAME,
+DATA_TYPE,
+CHARACTER_MAXIMUM_LENGTH AS LENGTH,
+NUMERIC_PRECISION AS PRECISION,
+NUMERIC_SCALE AS SCALE,
+ORDINAL_POSITION
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_NAME = ?
+ORDER BY ORDINAL_POSITION
+        """
+
+dicionario_sx3 = """
+        SELECT
+X3_CAMPO,
+X3_TIPO,
+X3_TITULO,
+X3_DESCRIC
+FROM SX3010
+WHERE X3_ARQUIVO = ?
+AND D_E_L_E_T_ <> '*'
+        """
+
 
 def report_query(days, filial):
     return f"""
@@ -202,10 +305,7 @@ SB1010 AS SB ON SD2.D2_COD = SB.B1_COD AND SB.D_E_L_E_T_ <> '*'
 WHERE SD2.D_E_L_E_T_  <> '*'
 AND SD2.D2_FILIAL = {filial}
 AND CONVERT(DATETIME, STUFF(STUFF(CAST(SD2.D2_EMISSAO AS VARCHAR), 7, 0, '-'), 5, 0, '-')) >= DATEADD(DAY, - {days}, GETDATE())
-AND SD2.D2_TES IN ('502','504','525','650','650','533','534','535','536','537','538','539','540','541','542','543','544','564','609','610','612','613','615',
-'617','618','620','621','625','626','627','629','632','635','636','640','648','650','660','662','664','665','668','669','672','673','678','759','765','766','767','768',
-'769','777','778','872','785','795','796','816','891','588','589','611','614','616','631','634','661','661','663','667','686','804',
-'503','523','524','529','530','531','532','642','657','866','867','868','869','692','799','807','819','876','877','882','883','903', '688', '817','574', '622', '623')
+AND SD2.D2_TES IN {report_tes}
 ORDER BY SD2.D2_EMISSAO
         """
 
@@ -223,14 +323,3 @@ AND SC7.C7_FILIAL = {filial}
 AND CONVERT(DATETIME, STUFF(STUFF(CAST(SC7.C7_EMISSAO AS VARCHAR), 7, 0, '-'), 5, 0, '-')) >= DATEADD(DAY, - {days}, GETDATE())
         """
 
-
-def search_table(table_name):
-    return f"""
-        SELECT TOP 1 * from {table_name}
-"""
-
-
-def table_result(columns_str, table):
-    return f"""
-        SELECT {columns_str} from {table}
-    """
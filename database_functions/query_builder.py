@@ -0,0 +1,117 @@
+import re
+from database_functions.catalog import table_catalog
+from database_functions.errors import InvalidIdentifier
+
+# Table and column names of the Protheus database: letters, digits and underscores
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Comparison operators accepted in WHERE conditions
+OPERATORS = {'=', '<>', '<', '<=', '>', '>=', 'LIKE'}
+
+# Sort directions accepted in ORDER BY
+DIRECTIONS = {'ASC', 'DESC'}
+
+
+def quote_identifier(name):
+    """
+    Quote a table or column name for SQL Server.
+
+    Parameters:
+    - name (str): The identifier.
+
+    Returns:
+    - str: The identifier between brackets.
+
+    Raises:
+    - InvalidIdentifier: If the name is not a plain identifier.
+    """
+    if not isinstance(name, str) or not IDENTIFIER_PATTERN.match(name):
+        raise InvalidIdentifier(f"Invalid identifier: {name!r}")
+    return f"[{name}]"
+
+
+def table_columns(table):
+    """
+    Get the columns of a table from the schema catalog.
+
+    Parameters:
+    - table (str): The table name.
+
+    Returns:
+    - list: The column names, in table order.
+
+    Raises:
+    - InvalidIdentifier: If the table is not a plain identifier or is not in the database.
+    """
+    quote_identifier(table)
+    catalog_df = table_catalog(table)
+    if catalog_df.empty:
+        raise InvalidIdentifier(f"Table {table} was not found.")
+    return catalog_df['COLUMN_NAME'].tolist()
+
+
+def build_select(table, columns, where=None, order_by=None, top=None):
+    """
+    Build a SELECT over one table with every identifier checked against the schema catalog and every
+    value bound as a parameter, so the same query shape reuses its plan whatever the values.
+
+    Usage:
+        query, params = build_select('SC7010', ['C7_NUM', 'C7_EMISSAO'],
+                                     where=[('C7_FILIAL', '=', '0101')], order_by=[('C7_EMISSAO', 'DESC')],
+                                     top=200)
+        data_frame = download(query, params)
+
+    Parameters:
+    - table (str): The table name.
+    - columns (list): Column names to select.
+    - where (list, optional): (column, operator, value) conditions, joined with AND.
+    - order_by (list, optional): Column names or (column, 'ASC' | 'DESC') tuples.
+    - top (int, optional): Maximum number of rows.
+
+    Returns:
+    - tuple: (query, tuple of bound parameters).
+
+    Raises:
+    - InvalidIdentifier: If the table, a column, an operator or a direction is not valid.
+    """
+    table = table.upper()
+    available = set(table_columns(table))
+
+    def column_name(name):
+        if name not in available:
+            raise InvalidIdentifier(f"Column {name!r} is not in {table}.")
+        return quote_identifier(name)
+
+    if not columns:
+        raise InvalidIdentifier("No column selected.")
+    params = []
+
+    select_clause = "SELECT"
+    if top is not None:
+        select_clause += " TOP (?)"
+        params.append(int(top))
+    select_clause += " " + ", ".join(column_name(column) for column in columns)
+
+    query = f"{select_clause}\nFROM {quote_identifier(table)}"
+
+    conditions = []
+    for column, operator, value in where or []:
+        operator = operator.upper()
+        if operator not in OPERATORS:
+            raise InvalidIdentifier(f"Invalid operator: {operator!r}")
+        conditions.append(f"{column_name(column)} {operator} ?")
+        params.append(value)
+    if conditions:
+        query += "\nWHERE " + " AND ".join(conditions)
+
+    ordering = []
+    for item in order_by or []:
+        column, direction = (item, 'ASC') if isinstance(item, str) else item
+        direction = direction.upper()
+        if direction not in DIRECTIONS:
+            raise InvalidIdentifier(f"Invalid sort direction: {direction!r}")
+        ordering.append(f"{column_name(column)} {direction}")
+    if ordering:
+        query += "\nORDER BY " + ", ".join(ordering)
+
+    return query, tuple(params)
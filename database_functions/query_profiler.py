@@ -0,0 +1,178 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# SQLite file receiving one row per profiled query
+PROFILE_DB_PATH = os.path.join('params', 'query_profile.sqlite')
+
+# Query being profiled by each thread, completed by finish_query
+_pending = threading.local()
+
+# Serializes writes to the SQLite file
+_profile_lock = threading.Lock()
+
+
+def profiling_enabled(config):
+    """
+    Check whether query profiling is switched on in db_config.ini.
+
+    The hook is opt-in:
+
+        [profiling]
+        enabled = true
+
+    Parameters:
+    - config (ConfigParser): The parsed db_config.ini.
+
+    Returns:
+    - bool: True if queries should be profiled.
+    """
+    return config.getboolean('profiling', 'enabled', fallback=False)
+
+
+def fingerprint(statement):
+    """
+    Normalize a statement so the same query with different literals gets the same fingerprint.
+
+    Parameters:
+    - statement (str): The SQL statement.
+
+    Returns:
+    - tuple: (fingerprint hash, normalized statement).
+    """
+    normalized = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    normalized = re.sub(r"\b\d+\b", "?", normalized)
+    normalized = re.sub(r"\s+", " ", normalized).strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+
+def start_query(statement, parameters):
+    """
+    Start profiling a query executed by this thread.
+
+    Parameters:
+    - statement (str): The SQL statement.
+    - parameters: The bound parameters.
+    """
+    _pending.record = {'statement': statement, 'parameters': parameters, 'started': time.perf_counter()}
+
+
+def mark_first_row():
+    """
+    Record the time to first row of the query being profiled by this thread.
+
+    The driver returns from execute once the server produced the first result set.
+    """
+    record = getattr(_pending, 'record', None)
+    if record is not None:
+        record['first_row'] = time.perf_counter() - record['started']
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_query(statement, parameters)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    mark_first_row()
+
+
+def attach_profiler(engine):
+    """
+    Register the profiling listeners on an engine, once.
+
+    Parameters:
+    - engine (Engine): The SQLAlchemy engine used for the query.
+    """
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _ensure_table(connection):
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS query_profile (
+            ts TEXT,
+            fingerprint TEXT,
+            statement TEXT,
+            params TEXT,
+            time_to_first_row REAL,
+            total_time REAL,
+            row_count INTEGER,
+            payload_bytes INTEGER
+        )
+    """)
+
+
+def finish_query(data_frame):
+    """
+    Complete the profile of the last query executed by this thread and store it.
+
+    Parameters:
+    - data_frame (DataFrame): The fetched result, used for the row count and payload size.
+    """
+    record = getattr(_pending, 'record', None)
+    if record is None:
+        return
+    _pending.record = None
+
+    total_time = time.perf_counter() - record['started']
+    query_fingerprint, normalized = fingerprint(record['statement'])
+    row_count = len(data_frame) if data_frame is not None else 0
+    payload_bytes = int(data_frame.memory_usage(index=True, deep=True).sum()) if data_frame is not None else 0
+
+    try:
+        with _profile_lock:
+            connection = sqlite3.connect(PROFILE_DB_PATH)
+            try:
+                _ensure_table(connection)
+                connection.execute(
+                    "INSERT INTO query_profile VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (datetime.datetime.now().isoformat(timespec='seconds'), query_fingerprint, normalized,
+                     json.dumps(record['parameters'], default=str), record.get('first_row'), total_time,
+                     row_count, payload_bytes)
+                )
+                connection.commit()
+            finally:
+                connection.close()
+    except Exception as e:
+        logger.error(f"Could not store the query profile: {e}")
+
+
+def slowest_queries(limit=10, path=PROFILE_DB_PATH):
+    """
+    Rank the profiled queries by average total time.
+
+    Parameters:
+    - limit (int, optional): Number of queries to return. Defaults to 10.
+    - path (str, optional): The SQLite file. Defaults to PROFILE_DB_PATH.
+
+    Returns:
+    - list: Tuples of (fingerprint, statement, runs, average time, max time, average time to first row,
+      average rows, average bytes).
+    """
+    if not os.path.exists(path):
+        return []
+
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("""
+            SELECT fingerprint, MIN(statement), COUNT(*), AVG(total_time), MAX(total_time),
+                   AVG(time_to_first_row), AVG(row_count), AVG(payload_bytes)
+            FROM query_profile
+            GROUP BY fingerprint
+            ORDER BY AVG(total_time) DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+    finally:
+        connection.close()
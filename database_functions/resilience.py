@@ -0,0 +1,197 @@
+import logging
+import random
+import threading
+import time
+from database_functions.errors import (DatabaseError, ConnectionFailure, QueryError, CircuitOpenError, QueryTimeout,
+                                       QueryCancelled)
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# SQLSTATEs of a lost or refused connection, counted by the circuit breaker
+CONNECTION_SQLSTATES = {'08001', '08003', '08004', '08007', '08S01'}
+
+# SQLSTATEs worth retrying on the same connection: deadlock victims
+TRANSIENT_SQLSTATES = {'40001'}
+
+# SQLSTATEs of an expired timeout, a login timeout being a connection failure and a query timeout the
+# limit of its family, which is not retried
+TIMEOUT_SQLSTATES = {'HYT00', 'HYT01'}
+
+# SQLSTATE of a statement stopped by Cursor.cancel
+CANCELLED_SQLSTATE = 'HY008'
+
+# Attempts of a query before giving up, the first one included
+RETRY_ATTEMPTS = 4
+
+# Backoff before the second attempt and upper bound of every backoff, in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+# Consecutive connection failures opening the circuit, and seconds it stays open before a trial query
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+def sqlstate(error):
+    """
+    Find the SQLSTATE of a driver error, following SQLAlchemy wrappers and chained exceptions.
+
+    pyodbc errors carry the SQLSTATE as their first argument.
+
+    Parameters:
+    - error (Exception): The raised exception.
+
+    Returns:
+    - str: The SQLSTATE, or None if the error does not carry one.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        args = getattr(error, 'args', ())
+        if args and isinstance(args[0], str) and len(args[0]) == 5 and args[0].isalnum():
+            return args[0].upper()
+        error = getattr(error, 'orig', None) or error.__cause__
+
+    return None
+
+
+def classify_error(error):
+    """
+    Decide how a failed query is handled.
+
+    Parameters:
+    - error (Exception): The raised exception.
+
+    Returns:
+    - str: 'connection' for a lost or refused connection, 'transient' for a deadlock, 'timeout' for a query
+      stopped by its timeout, 'cancelled' for a cancelled query, 'query' for anything that would fail again.
+    """
+    state = sqlstate(error)
+    if state in TIMEOUT_SQLSTATES:
+        return 'connection' if 'login' in str(error).lower() else 'timeout'
+    if state == CANCELLED_SQLSTATE:
+        return 'cancelled'
+    if state in CONNECTION_SQLSTATES or (state is None and isinstance(error, (ConnectionError, TimeoutError))):
+        return 'connection'
+    if state in TRANSIENT_SQLSTATES:
+        return 'transient'
+    return 'query'
+
+
+class CircuitBreaker:
+    """
+    Stop sending queries after repeated connection failures.
+
+    After failure_threshold consecutive connection failures the circuit opens and every call fails at
+    once with CircuitOpenError. Once reset_timeout seconds have passed a single trial call is let
+    through: it closes the circuit if it succeeds and opens it again if it fails.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be sent now."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.trial_running:
+                raise CircuitOpenError(f"The database is unreachable, new attempts in {max(remaining, 0):.0f}s.")
+            self.trial_running = True
+
+    def record_success(self):
+        """Close the circuit."""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        """Count a connection failure, opening the circuit once the threshold is reached."""
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                logger.error(f"Circuit opened after {self.failures} consecutive connection failures.")
+            self.trial_running = False
+
+    def release(self):
+        """End a trial call that failed for a reason unrelated to the connection."""
+        with self.lock:
+            self.trial_running = False
+
+
+# Circuit breaker shared by every query
+breaker = CircuitBreaker()
+
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """
+    Jittered exponential backoff: a random delay up to base_delay * 2 ** attempt, capped at max_delay.
+
+    Parameters:
+    - attempt (int): Number of the failed attempt, starting at 0.
+
+    Returns:
+    - float: Seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retry(func, description='query', attempts=RETRY_ATTEMPTS, circuit=breaker):
+    """
+    Run an idempotent read, retrying connection failures and deadlocks with backoff.
+
+    Parameters:
+    - func (callable): The read, called without arguments.
+    - description (str, optional): What is being run, for the log.
+    - attempts (int, optional): Attempts before giving up, the first one included.
+    - circuit (CircuitBreaker, optional): Breaker counting the connection failures.
+
+    Returns:
+    - The value returned by func.
+
+    Raises:
+    - CircuitOpenError: If the circuit is open.
+    - ConnectionFailure: If every attempt failed on a connection error or deadlock.
+    - QueryTimeout: If the query ran longer than its timeout.
+    - QueryCancelled: If the query was cancelled.
+    - QueryError: If the database rejected the query.
+    """
+    for attempt in range(attempts):
+        circuit.before_call()
+        try:
+            result = func()
+        except DatabaseError:
+            circuit.release()
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == 'connection':
+                circuit.record_failure()
+            else:
+                circuit.release()
+
+            if kind == 'timeout':
+                raise QueryTimeout(f"The {description} exceeded its timeout: {e}") from e
+            if kind == 'cancelled':
+                raise QueryCancelled(f"The {description} was cancelled.") from e
+            if kind == 'query':
+                raise QueryError(f"The {description} failed: {e}") from e
+            if attempt == attempts - 1:
+                raise ConnectionFailure(f"The {description} failed after {attempts} attempts: {e}") from e
+
+            delay = backoff_delay(attempt)
+            logger.error(f"The {description} failed ({kind}), attempt {attempt + 1} of {attempts}, "
+                         f"retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+        else:
+            circuit.record_success()
+            return result
@@ -0,0 +1,171 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import pandas as pd
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# Folder holding one Parquet file per cached query result
+CACHE_FOLDER = os.path.join('params', 'cache')
+
+# Seconds a result of each query family is reused once the cache is enabled, 0 disabling the cache for the
+# family. Report data is only cached by the report metrics cache and exports always read the live tables.
+DEFAULT_TTLS = {
+    'history': 1800,
+    'report': 0,
+    'lookup': 300,
+    'export': 0,
+}
+
+# Size of the cache folder above which the least recently used results are removed, in megabytes
+DEFAULT_MAX_SIZE_MB = 500
+
+# Serializes the evictions
+_cache_lock = threading.Lock()
+
+
+def parquet_available():
+    """Check whether pandas can write Parquet files, which needs pyarrow."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def cache_ttl(config, family=None):
+    """
+    Resolve how long the results of a query family are reused. The cache is opt-in and can be tuned in
+    db_config.ini:
+
+        [cache]
+        enabled = true
+        history = 900
+        max_size_mb = 200
+
+    Parameters:
+    - config (ConfigParser): The parsed db_config.ini.
+    - family (str, optional): The query family.
+
+    Returns:
+    - int: Seconds, 0 when results of the family are not cached.
+    """
+    if not family or not config.getboolean('cache', 'enabled', fallback=False):
+        return 0
+    return config.getint('cache', family, fallback=DEFAULT_TTLS.get(family, 0))
+
+
+def cache_key(query, params=None):
+    """
+    Hash a query and its parameters. Whitespace is normalized so reformatting a query keeps its key.
+
+    Parameters:
+    - query (str): SQL query.
+    - params (tuple, optional): Parameters for the SQL query.
+
+    Returns:
+    - str: Hex digest naming the cache file.
+    """
+    normalized = re.sub(r"\s+", " ", query).strip()
+    payload = json.dumps([normalized, list(params) if params else []], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_cached_result(key, ttl):
+    """
+    Get a cached result younger than the TTL, marking it as recently used.
+
+    Parameters:
+    - key (str): The cache key.
+    - ttl (int): Seconds the result is valid.
+
+    Returns:
+    - DataFrame: The cached result, with the time it was fetched in attrs['data_as_of'], or None when it is
+      missing or expired.
+    """
+    path = os.path.join(CACHE_FOLDER, f"{key}.parquet")
+    try:
+        written = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    # The modification time dates the result, the access time set here records the last use for the LRU eviction
+    if time.time() - written > ttl:
+        return None
+
+    try:
+        data_frame = pd.read_parquet(path)
+        data_frame.attrs['data_as_of'] = datetime.datetime.fromtimestamp(written)
+        os.utime(path, (time.time(), written))
+        return data_frame
+    except Exception as e:
+        logger.error(f"Could not read the cached result {key}: {e}")
+        return None
+
+
+def store_result(key, data_frame, max_size_mb=DEFAULT_MAX_SIZE_MB):
+    """
+    Store a query result and evict the least recently used results above the size limit.
+
+    Parameters:
+    - key (str): The cache key.
+    - data_frame (DataFrame): The query result.
+    - max_size_mb (int, optional): Size limit of the cache folder, in megabytes.
+    """
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = os.path.join(CACHE_FOLDER, f"{key}.parquet")
+
+    try:
+        # Write to a temporary file first so readers never see a half written result
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        data_frame.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+        now = time.time()
+        os.utime(path, (now, now))
+    except Exception as e:
+        logger.error(f"Could not cache the result {key}: {e}")
+        return
+
+    evict(max_size_mb * 1024 * 1024)
+
+
+def evict(max_bytes):
+    """
+    Remove the least recently used results until the cache folder fits the size limit.
+
+    Parameters:
+    - max_bytes (int): Size limit of the cache folder, in bytes.
+    """
+    with _cache_lock:
+        entries = []
+        for entry in os.scandir(CACHE_FOLDER):
+            if entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                logger.error(f"Could not evict the cached result {path}: {e}")
+
+
+def clear_result_cache():
+    """Remove every cached query result."""
+    if not os.path.isdir(CACHE_FOLDER):
+        return
+    for entry in os.scandir(CACHE_FOLDER):
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            logger.error(f"Could not remove the cached result {entry.path}: {e}")
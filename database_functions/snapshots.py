@@ -0,0 +1,151 @@
+import contextlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# Folder holding the Arrow IPC (Feather) snapshots of the branch data
+SNAPSHOT_FOLDER = os.path.join('params', 'snapshots')
+
+
+def arrow_available():
+    """Check whether the optional pyarrow package is installed."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def snapshot_prefix(name, filial=None):
+    """
+    Build the file name prefix shared by every version of a snapshot.
+
+    Parameters:
+    - name (str): What the snapshot holds, e.g. 'relatorio_vendas'.
+    - filial (str, optional): The branch code.
+
+    Returns:
+    - str: The prefix.
+    """
+    return f"{name}_{filial}." if filial else f"{name}."
+
+
+def write_snapshot(data_frame, name, filial=None, folder=SNAPSHOT_FOLDER):
+    """
+    Write a DataFrame once as an uncompressed Arrow IPC file, the layout that can be memory-mapped.
+
+    Every write gets a new file name. A mapped file cannot be replaced or removed on Windows, so an
+    older version still mapped by a reader is left alone and removed by a later write.
+
+    Parameters:
+    - data_frame (DataFrame): The data.
+    - name (str): What the snapshot holds.
+    - filial (str, optional): The branch code.
+    - folder (str, optional): Folder of the snapshot. Defaults to SNAPSHOT_FOLDER.
+
+    Returns:
+    - str: Path of the snapshot.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(folder, exist_ok=True)
+    prefix = snapshot_prefix(name, filial)
+    path = os.path.join(folder, f"{prefix}{time.time_ns()}.{uuid.uuid4().hex[:8]}.feather")
+
+    # Write to a temporary file first so readers never map a half written snapshot
+    temp_path = f"{path}.tmp"
+    table = pa.Table.from_pandas(data_frame, preserve_index=False)
+    feather.write_feather(table, temp_path, compression='uncompressed')
+    os.replace(temp_path, path)
+    logger.info(f"Snapshot written to {path}.")
+
+    # Drop the older versions that are no longer mapped, leaving the files other writers are still writing
+    for entry in os.scandir(folder):
+        if entry.name.startswith(prefix) and entry.name.endswith('.feather') and entry.path != path:
+            remove_snapshot(entry.path)
+
+    return path
+
+
+def read_snapshot(path, columns=None):
+    """
+    Memory-map a snapshot read-only.
+
+    The pages of the file are shared by every process mapping it, and numeric columns without missing
+    values are used in place without a copy. Those columns are read-only: copy the frame before
+    modifying it in place. The file stays mapped while the frame is alive.
+
+    Parameters:
+    - path (str): Path of the snapshot.
+    - columns (list, optional): Only map these columns.
+
+    Returns:
+    - DataFrame: The snapshot data.
+    """
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def remove_snapshot(path):
+    """
+    Remove a snapshot file, leaving it for a later attempt when a process still maps it.
+
+    Parameters:
+    - path (str): Path of the snapshot.
+
+    Returns:
+    - bool: True if the file was removed.
+    """
+    try:
+        os.remove(path)
+        return True
+    except OSError as e:
+        logger.info(f"Snapshot {path} is still in use and was kept: {e}")
+        return False
+
+
+def clear_snapshots(folder=SNAPSHOT_FOLDER):
+    """
+    Remove every snapshot that is not mapped anymore.
+
+    Parameters:
+    - folder (str, optional): Folder of the snapshots. Defaults to SNAPSHOT_FOLDER.
+    """
+    if not os.path.isdir(folder):
+        return
+    for entry in os.scandir(folder):
+        if entry.is_file():
+            remove_snapshot(entry.path)
+
+
+@contextlib.contextmanager
+def run_folder():
+    """
+    Give one run its own snapshot folder, removed once the run is done, so overlapping runs, e.g. from the
+    application and the command line, never read or replace each other's snapshots.
+
+    Usage:
+        with run_folder() as folder:
+            path = write_snapshot(data_frame, 'relatorio_base', '0101', folder=folder)
+
+    Yields:
+    - str: Path of the folder.
+    """
+    os.makedirs(SNAPSHOT_FOLDER, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix='run_', dir=SNAPSHOT_FOLDER)
+    try:
+        yield folder
+    finally:
+        clear_snapshots(folder)
+        try:
+            os.rmdir(folder)
+        except OSError as e:
+            logger.info(f"Snapshot folder {folder} is still in use and was kept: {e}")
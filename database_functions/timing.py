@@ -0,0 +1,219 @@
+import datetime
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import math
+import os
+import sys
+import threading
+import time
+
+# Get a logger
+logger = logging.getLogger(__name__)
+
+# JSON-lines file receiving one span per timed stage, in the params folder
+SPANS_FILE = os.path.join('params', 'spans.jsonl')
+
+# Size of the spans file at which it is rotated, and rotated files kept
+SPANS_MAX_BYTES = 5 * 1024 * 1024
+SPANS_BACKUP_COUNT = 3
+
+# Logger writing the spans, set up on the first span once db_config.ini enabled them
+_spans_logger = None
+_spans_checked = False
+
+# Serializes the set up from the worker threads
+_spans_lock = threading.Lock()
+
+
+def spans_logger():
+    """
+    Get the logger writing the spans file. Spans are opt-in in db_config.ini:
+
+        [timing]
+        spans = true
+
+    Returns:
+    - Logger: The spans logger, or None when spans are not recorded.
+    """
+    global _spans_logger, _spans_checked
+
+    with _spans_lock:
+        if not _spans_checked:
+            _spans_checked = True
+            try:
+                from database_functions.db_connect import load_config
+                enabled = load_config().getboolean('timing', 'spans', fallback=False)
+            except Exception as e:
+                logger.error(f"Could not read the timing settings, spans are not recorded: {e}")
+                enabled = False
+
+            if enabled:
+                os.makedirs(os.path.dirname(SPANS_FILE), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(SPANS_FILE, maxBytes=SPANS_MAX_BYTES,
+                                                               backupCount=SPANS_BACKUP_COUNT, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                _spans_logger = logging.getLogger('spans')
+                _spans_logger.propagate = False
+                _spans_logger.setLevel(logging.INFO)
+                _spans_logger.addHandler(handler)
+
+    return _spans_logger
+
+
+def describe_result(result):
+    """
+    Extract row count and approximate size from a stage result.
+
+    Parameters:
+    - result: Value returned by the stage, usually a DataFrame.
+
+    Returns:
+    - dict: 'rows' and 'bytes' when the result is a DataFrame, otherwise an empty dict.
+    """
+    if hasattr(result, 'shape') and hasattr(result, 'memory_usage'):
+        return {'rows': int(result.shape[0]), 'bytes': int(result.memory_usage(index=True).sum())}
+    return {}
+
+
+def record_span(stage, duration, **fields):
+    """
+    Append a span to the spans file, when spans are enabled.
+
+    Parameters:
+    - stage (str): Name of the timed stage.
+    - duration (float): Duration in seconds.
+    - **fields: Extra values such as rows, bytes or filial.
+    """
+    spans = spans_logger()
+    if spans is None:
+        return
+
+    span_data = {
+        'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'stage': stage,
+        'duration': round(duration, 6),
+        'thread': threading.current_thread().name,
+    }
+    span_data.update(fields)
+
+    try:
+        spans.info(json.dumps(span_data, default=str, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"Could not record the span for {stage}: {e}")
+
+
+class span:
+    """
+    Context manager timing a block of code and recording it as a span.
+
+    Usage:
+        with span('write_sheet', filial='0101') as current:
+            ...
+            current.set(rows=len(data_frame))
+    """
+
+    def __init__(self, stage, **fields):
+        self.stage = stage
+        self.fields = fields
+        self.started = None
+
+    def set(self, **fields):
+        """Add or replace values recorded with the span."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record_span(self.stage, time.perf_counter() - self.started, **self.fields)
+        return False
+
+
+def timed(stage=None):
+    """
+    Decorator recording every call of a function as a span.
+
+    The span carries the 'filial' argument when the function has one, and the row count and
+    size of the result when it returns a DataFrame.
+
+    Parameters:
+    - stage (str, optional): Name of the stage. Defaults to the function name.
+    """
+    def decorator(func):
+        stage_name = stage or func.__name__
+        signature = inspect.signature(func)
+        has_filial = 'filial' in signature.parameters
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            fields = {}
+            if has_filial:
+                try:
+                    fields['filial'] = signature.bind_partial(*args, **kwargs).arguments.get('filial')
+                except TypeError:
+                    pass
+
+            with span(stage_name, **fields) as current:
+                result = func(*args, **kwargs)
+                current.set(**describe_result(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    rank = math.ceil(fraction * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def summarize(path=SPANS_FILE, output=None):
+    """
+    Print the count, p50 and p95 duration of every stage found in a spans file and its rotated files.
+
+    Parameters:
+    - path (str, optional): The spans file. Defaults to SPANS_FILE.
+    - output (file, optional): Where to print. Defaults to sys.stdout.
+
+    Returns:
+    - dict: Stage name mapped to a (count, p50, p95) tuple.
+    """
+    output = output or sys.stdout
+
+    paths = [candidate for candidate in [path] + [f"{path}.{number}" for number in range(1, SPANS_BACKUP_COUNT + 1)]
+             if os.path.exists(candidate)]
+    if not paths:
+        print(f"No spans recorded in {path}.", file=output)
+        return {}
+
+    durations = {}
+    for spans_path in paths:
+        with open(spans_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    span_data = json.loads(line)
+                except ValueError:
+                    continue
+                durations.setdefault(span_data['stage'], []).append(span_data['duration'])
+
+    summary = {}
+    print(f"{'stage':<32}{'count':>8}{'p50 (s)':>12}{'p95 (s)':>12}", file=output)
+    for stage_name in sorted(durations):
+        values = sorted(durations[stage_name])
+        summary[stage_name] = (len(values), percentile(values, 0.5), percentile(values, 0.95))
+        count, p50, p95 = summary[stage_name]
+        print(f"{stage_name:<32}{count:>8}{p50:>12.3f}{p95:>12.3f}", file=output)
+
+    return summary
+
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else SPANS_FILE)
@@ -1,6 +1,11 @@
+import time
+
+# Measure the startup path from the first import
+STARTUP_STARTED = time.perf_counter()
+
 import logging
-from user_interface.main_ui import MainWindowLogic
-from PyQt5.QtWidgets import QApplication
+import multiprocessing
+import sys
 
 # Set up logging configurations.
 logging.basicConfig(
@@ -10,6 +15,27 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# Seconds allowed between process start and the painted window
+STARTUP_BUDGET = 2.0
+
+# Modules that must not be imported before the window is shown
+DEFERRED_MODULES = ['pandas', 'numpy', 'openpyxl', 'sqlalchemy']
+
+
+def check_startup_budget():
+    """
+    Log how long the window took to appear and warn when the startup budget is exceeded
+    or when a heavy module was imported on the startup path.
+    """
+    elapsed = time.perf_counter() - STARTUP_STARTED
+    logging.info(f"Window shown {elapsed:.2f}s after start.")
+    if elapsed > STARTUP_BUDGET:
+        logging.warning(f"Startup took {elapsed:.2f}s, above the {STARTUP_BUDGET:.2f}s budget.")
+
+    eager_modules = [name for name in DEFERRED_MODULES if name in sys.modules]
+    if eager_modules:
+        logging.warning(f"Modules imported before the window was shown: {', '.join(eager_modules)}")
+
 
 def main():
     """
@@ -18,16 +44,33 @@ def main():
     This function initializes the MainWindow and starts the PyQt event loop.
     Any unexpected errors during this process are logged and then raised.
     """
+    # Imported here so the report worker processes, which import this module, do not load Qt
+    from user_interface.main_ui import MainWindowLogic
+    from PyQt5.QtWidgets import QApplication
+
     try:
         # Create a PyQt application instance.
         app = QApplication([])
 
+        # Let the Qt event loop drive asyncio when qasync is installed
+        from database_functions.async_access import install_qt_loop, shutdown_workers
+        loop = install_qt_loop(app)
+
+        # Cancel the queries of the worker pool on close instead of waiting for them
+        app.aboutToQuit.connect(shutdown_workers)
+
         # Create a MainWindow
         window = MainWindowLogic()
         window.show()
+        app.processEvents()
+        check_startup_budget()
 
         # Start the PyQt event loop.
-        app.exec_()
+        if loop is not None:
+            with loop:
+                loop.run_forever()
+        else:
+            app.exec_()
 
     except Exception as e:
         logging.error(f"An unexpected error occurred while creating the session: {e}")
@@ -35,5 +78,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Let the frozen executable start the report worker processes instead of a new window
+    multiprocessing.freeze_support()
+
     # If the script is executed as the main module, call the main function.
     main()
@@ -9,7 +9,11 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('db_config.ini', '.')],
-    hiddenimports=['pyodbc', 'configparser'],
+    hiddenimports=['pyodbc', 'configparser', 'database_functions.funcoes_base', 'database_functions.params_update',
+                   'main_functions.sugestao_compra', 'main_functions.analise_inventario',
+                   'main_functions.download_tabelas', 'main_functions.busca_produtos',
+                   'main_functions.busca_tabelas', 'main_functions.processamento',
+                   'database_functions.async_access', 'database_functions.snapshots'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
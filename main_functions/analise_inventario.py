@@ -1,17 +1,135 @@
 import pandas as pd
 import numpy as np
 import os
+import time
 import logging
-from database_functions.funcoes_base import download, save_to_excel
-from database_functions.queries import report_query, report_query_orders
+import threading
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from database_functions.async_access import concurrent_calls
+from database_functions.db_connect import config_flag, load_config
+from database_functions.funcoes_base import download, save_to_excel, BranchWorkbook
+from database_functions.queries import (report_query, report_query_orders, relatorio_vendas_agregado,
+                                        relatorio_pedidos_agregado, relatorio_vendas_diario, relatorio_pedidos_diario)
+from database_functions.params_update import save_frame_locally, load_frame_locally
+from database_functions.snapshots import arrow_available, read_snapshot, write_snapshot, run_folder
 from main_functions.processamento import classify_stock_items
+from database_functions.timing import timed
 
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Longest report window, in days, kept by the per-branch metrics cache
+REPORT_CACHE_DAYS = 730
+
+# Seconds a branch's cached daily metrics are reused before being fetched again
+REPORT_CACHE_TTL = 3600
+
+# Report period used for the inventory snapshot read by the product search
+INVENTORY_SNAPSHOT_PERIOD = "12 meses"
+
+# Local store holding the inventory snapshot
+INVENTORY_SNAPSHOT_FILE = "inv_df.pkl"
+
+# Off-hours window, (start hour, end hour), when the snapshot may be rebuilt
+INVENTORY_SNAPSHOT_OFF_HOURS = (19, 7)
+
+# Age, in hours, after which the snapshot is rebuilt in the next off-hours window
+INVENTORY_SNAPSHOT_MAX_AGE = 12
+
+# Snapshot names of the Base_df rows, sales and orders of a branch handed to a report worker process
+REPORT_SNAPSHOT_NAMES = ('relatorio_base', 'relatorio_vendas', 'relatorio_pedidos')
+
+# Worker processes computing the branches of a report at once, changed with 'processes' in the [report]
+# section of db_config.ini. Each spawned worker imports pandas and the pipelines again, so few are started.
+REPORT_MAX_PROCESSES = 2
+
+# Daily sales and order metrics per (filial, select_func), shared by every report period
+_report_cache = {}
+_report_cache_lock = threading.Lock()
+
+
+def get_daily_metrics(filial, select_func):
+    """
+    Get the daily sales or order metrics of a branch for the longest report window.
+
+    The metrics are grouped by the database per B1_ZGRUPO and emission date, and kept in memory for
+    REPORT_CACHE_TTL seconds so every report period can be derived from them without a new query.
+
+    Parameters:
+    - filial (str): The branch code.
+    - select_func (int): 1 for sales metrics, anything else for order metrics.
+
+    Returns:
+    - DataFrame: One row per 'Agrupamento' and 'EMISSAO' date with the summed metrics.
+    """
+    cache_key = (filial, select_func)
+
+    with _report_cache_lock:
+        cached = _report_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < REPORT_CACHE_TTL:
+        logger.info(f"Using cached report metrics for branch {filial}.")
+        return cached[1]
+
+    query = relatorio_vendas_diario if select_func == 1 else relatorio_pedidos_diario
+    daily_df = download(query, (filial, -REPORT_CACHE_DAYS), family='report')
+    daily_df = daily_df.rename(columns={'B1_ZGRUPO': 'Agrupamento'})
+
+    # Shown to the user as the time the report data is from
+    daily_df.attrs['data_as_of'] = datetime.now()
+
+    with _report_cache_lock:
+        _report_cache[cache_key] = (time.monotonic(), daily_df)
+
+    return daily_df
+
+
+def derive_period_metrics(daily_df, days):
+    """
+    Sum the cached daily metrics over the trailing days of a report period.
+
+    Parameters:
+    - daily_df (DataFrame): Daily metrics returned by get_daily_metrics.
+    - days (int): Number of trailing days of the period.
+
+    Returns:
+    - DataFrame: One row per 'Agrupamento' with the metrics of the period.
+    """
+    # Same cutoff as the database filter: emission dates after today minus the period
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+    period_df = daily_df[daily_df['EMISSAO'] > cutoff]
+
+    metrics_df = period_df.drop(columns='EMISSAO').groupby('Agrupamento', as_index=False).sum()
+    metrics_df.attrs['data_as_of'] = daily_df.attrs.get('data_as_of')
+    return metrics_df
+
+
+def clear_report_cache():
+    """
+    Drop every cached branch metric, forcing the next report to query the database.
+    """
+    with _report_cache_lock:
+        _report_cache.clear()
+
 
 # Get the sales information
-def get_data(filial, period, select_func):
+def get_data(filial, period, select_func, pushdown=False, use_cache=False):
+    """
+    Fetch the sales (select_func == 1) or orders data of a branch for the report period.
+
+    Parameters:
+    - filial (str): The branch code.
+    - period (int): The number of months selected by the user.
+    - select_func (int): 1 for sales data, anything else for orders data.
+    - pushdown (bool, optional): If True, the database returns the metrics already grouped by B1_ZGRUPO
+      instead of every invoice or order line. Defaults to False.
+    - use_cache (bool, optional): With pushdown, derive the metrics from the cached daily metrics of the
+      longest window instead of querying the period. Defaults to False.
+
+    Returns:
+    - DataFrame: The fetched data, or None for an invalid period.
+    """
     # Map user-selected period to number of days
     period_to_days = {
         3: 89,
@@ -27,39 +145,57 @@ def get_data(filial, period, select_func):
     if query_time == 0:
         return None
 
+    if pushdown and use_cache:
+        # Sum the trailing days of the cached longest window
+        return derive_period_metrics(get_daily_metrics(filial, select_func), query_time)
+
+    if pushdown:
+        # Let the database group the lines and return one row per B1_ZGRUPO
+        query = relatorio_vendas_agregado if select_func == 1 else relatorio_pedidos_agregado
+        metrics_df = download(query, (filial, -query_time), family='report')
+
+        metrics_df = metrics_df.rename(columns={'B1_ZGRUPO': 'Agrupamento'})
+
+        return metrics_df
+
     if select_func == 1:
         # Generate the query string and fetch the sales data
         query_string = report_query(query_time, filial)
-        sales_df = download(query_string)
+        sales_df = download(query_string, family='report')
 
         sales_df = sales_df.rename(columns={'B1_ZGRUPO': 'Agrupamento'})
 
         return sales_df
     else:
         query_string = report_query_orders(query_time, filial)
-        orders_df = download(query_string)
+        orders_df = download(query_string, family='report')
 
         orders_df = orders_df.rename(columns={'B1_ZGRUPO': 'Agrupamento'})
 
         return orders_df
 
 
+@timed()
 def calculate_sales_metrics(data_frame, months):
     """
     Calculate the sales metrics for a given DataFrame.
 
     Parameters:
-    - data_frame (DataFrame): The sales data.
+    - data_frame (DataFrame): The sales data, either invoice lines or metrics already grouped by the database.
     - months (int): The number of months selected by the user.
 
     Returns:
     - DataFrame: DataFrame containing the sales metrics for each B1_ZGRUPO.
     """
-    # Group by B1_ZGRUPO and calculate metrics
-    metrics = data_frame.groupby('Agrupamento').agg(
-        sales_period_count=pd.NamedAgg(column='D2_COD', aggfunc='size'),
-        demand_period_sum=pd.NamedAgg(column='D2_QUANT', aggfunc='sum'),
-    )
+    if 'demand_period_sum' in data_frame.columns:
+        # Metrics were already grouped by the database
+        metrics = data_frame.set_index('Agrupamento')[['sales_period_count', 'demand_period_sum']].copy()
+    else:
+        # Group by B1_ZGRUPO and calculate metrics
+        metrics = data_frame.groupby('Agrupamento').agg(
+            sales_period_count=pd.NamedAgg(column='D2_COD', aggfunc='size'),
+            demand_period_sum=pd.NamedAgg(column='D2_QUANT', aggfunc='sum'),
+        )
 
     # Calculate averages
     metrics['average_demand'] = np.ceil(metrics['demand_period_sum'] / months).astype(int)
@@ -67,22 +203,27 @@ def calculate_sales_metrics(data_frame, months):
     return metrics
 
 
+@timed()
 def calculate_order_metrics(data_frame):
     """
     Calculate the orders metrics for a given DataFrame.
 
     Parameters:
-    - data_frame (DataFrame): The order data.
+    - data_frame (DataFrame): The order data, either order lines or metrics already grouped by the database.
     - months (int): The number of months selected by the user.
 
     Returns:
     - DataFrame: DataFrame containing the sales metrics for each B1_ZGRUPO.
     """
-    # Group by B1_ZGRUPO and calculate metrics
-    metrics = data_frame.groupby('Agrupamento').agg(
-        cost_period_sum=pd.NamedAgg(column='C7_PRECO', aggfunc='sum'),
-        cost_period_size=pd.NamedAgg(column='C7_PRECO', aggfunc='size')
-    )
+    if 'cost_period_sum' in data_frame.columns:
+        # Metrics were already grouped by the database
+        metrics = data_frame.set_index('Agrupamento')[['cost_period_sum', 'cost_period_size']].copy()
+    else:
+        # Group by B1_ZGRUPO and calculate metrics
+        metrics = data_frame.groupby('Agrupamento').agg(
+            cost_period_sum=pd.NamedAgg(column='C7_PRECO', aggfunc='sum'),
+            cost_period_size=pd.NamedAgg(column='C7_PRECO', aggfunc='size')
+        )
 
     # Calculate averages
     metrics['average_cost'] = np.round(metrics['cost_period_sum'] / metrics['cost_period_size'], decimals=2)
@@ -90,6 +231,7 @@ def calculate_order_metrics(data_frame):
     return metrics
 
 
+@timed()
 def merge_data(original_data, sales_metrics, orders_metrics):
     """
     Merge the original data with the sales metrics using the B1_ZGRUPO column.
@@ -115,7 +257,158 @@ def merge_data(original_data, sales_metrics, orders_metrics):
     return merged_data
 
 
-def create_report(filial, period, func):
+@timed()
+def finish_report(base_df, sales_metrics, orders_metrics):
+    """
+    Merge Base_df with the sales and order metrics, add 'Ind. Stk' and give the report its final columns.
+
+    Parameters:
+    - base_df (DataFrame): The Base_df rows of the branches in the report.
+    - sales_metrics (DataFrame): Sales metrics with a 'Filial' column.
+    - orders_metrics (DataFrame): Order metrics with a 'Filial' column.
+
+    Returns:
+    - DataFrame: The report with the final column names and order.
+    """
+    aggregated_report_df = merge_data(base_df, sales_metrics, orders_metrics)
+
+    # coluna filial em primeiro e coluna de ind_estoque antes da nota
+    columns_to_keep = ['Filial', 'Agrupamento', 'Código', 'Descrição', 'Grupo', 'Estoque', 'Quantidade pedida', 'Nota',
+                       'Segurança', 'min', 'max', 'sales_period_count', 'demand_period_sum', 'average_demand',
+                       'average_cost']
+
+    intermediate_df = aggregated_report_df[columns_to_keep].copy()
+
+    intermediate_df.replace(np.nan, 0, inplace=True)
+
+    final_df = classify_stock_items(intermediate_df)
+    # Define the new order and the new names for specific columns
+    column_order = ['Filial', 'Agrupamento', 'Código', 'Descrição', 'Grupo', 'Estoque', 'Quantidade pedida', 'Ind. Stk',
+                    'Nota', 'Segurança', 'min', 'max', 'Vendas no período', 'Demanda no período', 'Demanda media',
+                    'Custo médio']
+
+    # Dictionary for renaming columns
+    rename_dict = {
+        'sales_period_count': 'Vendas no período',
+        'demand_period_sum': 'Demanda no período',
+        'average_demand': 'Demanda media',
+        'average_cost': 'Custo médio'
+    }
+
+    # Rename and reorder the columns
+    final_df_renamed = final_df.rename(columns=rename_dict).copy()
+    final_df_ordered = final_df_renamed[column_order].copy()
+
+    return final_df_ordered
+
+
+def compute_branch_report(filial, period_int, base_source, sales_source, orders_source):
+    """
+    Compute the report rows of one branch. Runs in a worker process of create_report.
+
+    Each source is either a DataFrame or the path of a snapshot written by the parent process, which is
+    memory-mapped instead of being pickled to the worker.
+
+    Parameters:
+    - filial (str): The branch code.
+    - period_int (int): The number of months of the report.
+    - base_source (DataFrame or str): The Base_df rows of the branch.
+    - sales_source (DataFrame or str): The fetched sales data of the branch.
+    - orders_source (DataFrame or str): The fetched orders data of the branch.
+
+    Returns:
+    - DataFrame: The report rows of the branch.
+    """
+    base_df, sales_df, orders_df = [read_snapshot(source) if isinstance(source, str) else source
+                                    for source in (base_source, sales_source, orders_source)]
+
+    sales_metrics = calculate_sales_metrics(sales_df, period_int)
+    sales_metrics['Filial'] = filial
+    orders_metrics = calculate_order_metrics(orders_df)
+    orders_metrics['Filial'] = filial
+
+    return finish_report(base_df, sales_metrics, orders_metrics)
+
+
+def compute_in_processes(base_df, fetched, branches, period_int):
+    """
+    Compute the report of several branches in a process pool, outside the GIL of the calling process.
+    Experimental: starting the workers costs more than the per-branch compute saves on the usual data
+    sizes, see create_report.
+
+    The frames of each branch are written as snapshots to a folder of this run when pyarrow is installed,
+    otherwise they are pickled to the workers. The folder is removed once the workers are done.
+
+    Parameters:
+    - base_df (DataFrame): The Base_df rows of every branch.
+    - fetched (list): The sales and orders data of each branch, in that order.
+    - branches (list): The branch codes, in the order of fetched.
+    - period_int (int): The number of months of the report.
+
+    Returns:
+    - DataFrame: The report rows of every branch, in the order of branches.
+    """
+    use_snapshots = arrow_available()
+    max_processes = load_config().getint('report', 'processes', fallback=REPORT_MAX_PROCESSES)
+
+    with run_folder() as folder:
+        jobs = []
+        for position, current_filial in enumerate(branches):
+            sources = [base_df[base_df['Filial'] == current_filial], fetched[2 * position],
+                       fetched[2 * position + 1]]
+
+            if use_snapshots:
+                for index, name in enumerate(REPORT_SNAPSHOT_NAMES):
+                    try:
+                        sources[index] = write_snapshot(sources[index], name, current_filial, folder=folder)
+                    except Exception as e:
+                        # Columns Arrow cannot type, e.g. mixed values read from Excel, are pickled instead
+                        logger.warning(f"Could not write the {name} snapshot of branch {current_filial}: {e}")
+
+            jobs.append((current_filial, sources))
+
+        # The workers have exited, and unmapped the snapshots, when the pool is left
+        with ProcessPoolExecutor(max_workers=max(1, min(len(jobs), max_processes))) as pool:
+            futures = [pool.submit(compute_branch_report, current_filial, period_int, *sources)
+                       for current_filial, sources in jobs]
+            frames = [future.result() for future in futures]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def save_report(final_df_ordered, filial, period_int, func, consolidated, data_as_of=None):
+    """
+    Save the report unless it was requested for another pipeline.
+
+    Parameters:
+    - final_df_ordered (DataFrame): The report.
+    - filial (str): The branch of the report, 'Todas' for all branches.
+    - period_int (int): The number of months of the report.
+    - func (bool): True when the report is used by another pipeline and not saved.
+    - consolidated (bool): Write one sheet per branch for 'Todas'.
+    - data_as_of (datetime, optional): When the cached data of the report was fetched.
+
+    Returns:
+    - DataFrame: The report.
+    """
+    if data_as_of is not None:
+        final_df_ordered.attrs['data_as_of'] = data_as_of
+        logger.info(f"Report built from metrics fetched at {data_as_of:%Y-%m-%d %H:%M}.")
+
+    if not func and consolidated and filial == 'Todas':
+        with BranchWorkbook(f"analise_inventario_{period_int}", 'Todas') as workbook:
+            for current_filial, branch_df in final_df_ordered.groupby('Filial', sort=False):
+                workbook.write_sheet(branch_df, current_filial)
+    elif not func:
+        save_to_excel(final_df_ordered, f"analise_inventario_{period_int}",
+                      'Todas' if filial == 'Todas' else filial, open_file=False)
+
+    return final_df_ordered
+
+
+@timed()
+def create_report(filial, period, func, consolidated=False, pushdown=None, use_cache=None, concurrent_fetch=None,
+                  process_pool=False):
     """
     Generates a sales report for a given branch and period.
 
@@ -123,11 +416,27 @@ def create_report(filial, period, func):
     - filial (str): The branch for which the report is to be generated. 'Todas' indicates all branches.
     - period (str): The period for the report, such as '3 meses', '6 meses', '12 meses', or '24 meses'.
     - func (bool): Flag to determine the mode of report generation. True for individual branch reports, False for aggregated.
+    - consolidated (bool, optional): When saving 'Todas', write one sheet per branch to a single workbook
+      instead of one concatenated sheet. Defaults to False.
+    - pushdown (bool, optional): If True, sales and order metrics are grouped by the database. Defaults to the
+      'pushdown' option of the [report] section of db_config.ini, on when it is not set.
+    - use_cache (bool, optional): With pushdown, reuse the per-branch daily metrics cache so other periods are
+      derived locally. The report then holds the time the data was fetched in attrs['data_as_of']. Defaults
+      to the 'use_cache' option of the [report] section of db_config.ini, off when it is not set.
+    - concurrent_fetch (bool, optional): Fetch the sales and order metrics of every branch at the same time.
+      Defaults to the 'concurrent' option of the [fetch] section of db_config.ini, off when it is not set.
+    - process_pool (bool, optional): Experimental. Compute the branches of 'Todas' in worker processes, with
+      the fetched data shared through snapshots. Starting a worker takes about as long as the compute of a
+      whole report, so it only pays off on very large Base_df files. Defaults to False.
 
     Returns:
     - DataFrame: The generated report as a DataFrame.
     """
 
+    pushdown = config_flag('report', 'pushdown', pushdown, fallback=True)
+    use_cache = config_flag('report', 'use_cache', use_cache, fallback=False)
+    concurrent_fetch = config_flag('fetch', 'concurrent', concurrent_fetch, fallback=False)
+
     # Convert period from string to integer
     period_mapping = {"3 meses": 3, "6 meses": 6, "12 meses": 12, "24 meses": 24}
     period_int = period_mapping.get(period, 0)
@@ -141,66 +450,133 @@ def create_report(filial, period, func):
     # Determine branches to process
     filials_to_process = all_branches if filial == 'Todas' else [filial]
 
-    aggregated_report_df = None
+    # Read Base_df once and keep only the rows of the branches being processed
+    base_df = pd.read_excel(data_file_path)
+    base_df['Filial'] = base_df['Filial'].astype(str).str.zfill(4)
+    base_df = base_df[base_df['Filial'].isin(filials_to_process)].copy()
+
+    # Sales (1) and orders (0) metrics of every branch, fetched at the same time when concurrent_fetch is set
+    fetches = [functools.partial(get_data, current_filial, period_int, select_func=select_func, pushdown=pushdown,
+                                 use_cache=use_cache)
+               for current_filial in filials_to_process for select_func in (1, 0)]
+    if concurrent_fetch:
+        fetched = concurrent_calls(*fetches)
+    else:
+        fetched = [fetch() for fetch in fetches]
+
+    # Oldest fetch time of cached metrics, None when every metric was queried for this report
+    cached_times = [frame.attrs['data_as_of'] for frame in fetched
+                    if frame is not None and frame.attrs.get('data_as_of') is not None]
+    data_as_of = min(cached_times) if cached_times else None
+
+    if process_pool and len(filials_to_process) > 1:
+        # Compute every branch in its own worker process and concatenate the results
+        final_df_ordered = compute_in_processes(base_df, fetched, filials_to_process, period_int)
+        return save_report(final_df_ordered, filial, period_int, func, consolidated, data_as_of)
+
+    sales_frames = []
+    order_frames = []
 
-    for current_filial in filials_to_process:
+    for position, current_filial in enumerate(filials_to_process):
         # Process sales information
-        sales_info_df = get_data(current_filial, period_int, select_func=1)
+        sales_info_df = fetched[2 * position]
         sales_info_df = calculate_sales_metrics(sales_info_df, period_int)
         sales_info_df['Filial'] = current_filial
+        sales_frames.append(sales_info_df)
 
         # Process order information
-        order_info_df = get_data(current_filial, period_int, select_func=0)
+        order_info_df = fetched[2 * position + 1]
         order_info_df = calculate_order_metrics(order_info_df)
         order_info_df['Filial'] = current_filial
+        order_frames.append(order_info_df)
 
-        # Create and merge final data
-        base_df = pd.read_excel(data_file_path)
-        report_df = merge_data(base_df, sales_info_df, order_info_df)
+    # Merge Base_df once against the metrics of every branch, keyed by 'Agrupamento' and 'Filial'
+    final_df_ordered = finish_report(base_df, pd.concat(sales_frames), pd.concat(order_frames))
 
-        # Concatenate this report_df to the aggregated_report_df
-        if aggregated_report_df is None:
-            aggregated_report_df = report_df
-        else:
-            aggregated_report_df = pd.concat([aggregated_report_df, report_df], ignore_index=True)
+    return save_report(final_df_ordered, filial, period_int, func, consolidated, data_as_of)
 
-    # coluna filial em primeiro e coluna de ind_estoque antes da nota
-    columns_to_keep = ['Filial', 'Agrupamento', 'Código', 'Descrição', 'Grupo', 'Estoque', 'Quantidade pedida', 'Nota',
-                       'Segurança', 'min', 'max', 'sales_period_count', 'demand_period_sum', 'average_demand',
-                       'average_cost']
 
-    intermediate_df = aggregated_report_df[columns_to_keep].copy()
+@timed()
+def update_inventory_snapshot(period=INVENTORY_SNAPSHOT_PERIOD):
+    """
+    Rebuild the inventory analysis snapshot used by the product search.
 
-    intermediate_df.replace(np.nan, 0, inplace=True)
+    Runs the report for all branches and stores it indexed by ('Agrupamento', 'Filial'), so the search
+    reads fresh min/max/Segurança/Nota/Ind. Stk values without running the report itself.
 
-    final_df = classify_stock_items(intermediate_df)
-    # Define the new order and the new names for specific columns
-    column_order = ['Filial', 'Agrupamento', 'Código', 'Descrição', 'Grupo', 'Estoque', 'Quantidade pedida', 'Ind. Stk',
-                    'Nota', 'Segurança', 'min', 'max', 'Vendas no período', 'Demanda no período', 'Demanda media',
-                    'Custo médio']
+    Parameters:
+    - period (str, optional): The report period. Defaults to INVENTORY_SNAPSHOT_PERIOD.
 
-    # Dictionary for renaming columns
-    rename_dict = {
-        'sales_period_count': 'Vendas no período',
-        'demand_period_sum': 'Demanda no período',
-        'average_demand': 'Demanda media',
-        'average_cost': 'Custo médio'
-    }
+    Returns:
+    - DataFrame: The report used for the snapshot.
+    """
+    logger.info(f"Updating the inventory snapshot for {period}.")
 
-    # Rename and reorder the columns
-    final_df_renamed = final_df.rename(columns=rename_dict).copy()
-    final_df_ordered = final_df_renamed[column_order].copy()
+    report_df = create_report('Todas', period, True)
+    snapshot = report_df.set_index(['Agrupamento', 'Filial'])
+    save_frame_locally(INVENTORY_SNAPSHOT_FILE, snapshot)
 
-    # Remove duplicate rows based on 'Filial' and 'Agrupamento' columns
-    final_df_ordered = final_df_ordered.drop_duplicates(subset=['Filial', 'Agrupamento'])
+    logger.info(f"Inventory snapshot updated with {len(snapshot)} rows.")
+    return report_df
 
-    # Filter the DataFrame for the specified 'Filial' if not processing all branches
-    if filial != 'Todas':
-        final_df_ordered = final_df_ordered[final_df_ordered['Filial'] == filial]
 
-    # After processing all branches, save the aggregated DataFrame
-    if not func:
-        save_to_excel(final_df_ordered, f"analise_inventario_{period_int}",
-                      'Todas' if filial == 'Todas' else filial, open_file=False)
 
-    return final_df_ordered
+def update_inventory_snapshot_if_due():
+    """
+    Rebuild the inventory analysis snapshot when inventory_snapshot_is_due says it should be rebuilt.
+
+    Meant for the background thread of the interface, so the check reads the snapshot file off the GUI thread.
+
+    Returns:
+    - DataFrame or None: The report used for the snapshot, or None if the snapshot was not due.
+    """
+    if not inventory_snapshot_is_due():
+        logger.info("Inventory snapshot is up to date.")
+        return None
+    return update_inventory_snapshot()
+
+def load_inventory_snapshot():
+    """
+    Get the inventory analysis snapshot indexed by ('Agrupamento', 'Filial').
+
+    Falls back to params/inv_df.xlsx while no snapshot has been built yet.
+
+    Returns:
+    - DataFrame: The inventory analysis data indexed by ('Agrupamento', 'Filial').
+    """
+    snapshot = load_frame_locally(INVENTORY_SNAPSHOT_FILE, cached=True)
+    if snapshot is not None:
+        return snapshot
+
+    logger.info("Inventory snapshot not found, reading inv_df.xlsx.")
+    inv_df = pd.read_excel(os.path.join('params', 'inv_df.xlsx'))
+    inv_df['Agrupamento'] = inv_df['Agrupamento'].astype(str)
+    inv_df['Filial'] = inv_df['Filial'].astype(str).str.zfill(4)
+    return inv_df.set_index(['Agrupamento', 'Filial'])
+
+
+def inventory_snapshot_is_due(now=None):
+    """
+    Check whether the inventory snapshot should be rebuilt now.
+
+    The snapshot is rebuilt right away when it does not exist, otherwise only during the off-hours
+    window once it is older than INVENTORY_SNAPSHOT_MAX_AGE hours.
+
+    Parameters:
+    - now (datetime, optional): The current time. Defaults to datetime.now().
+
+    Returns:
+    - bool: True if the snapshot should be rebuilt.
+    """
+    now = now or datetime.now()
+    snapshot_path = os.path.join('params', INVENTORY_SNAPSHOT_FILE)
+
+    if not os.path.exists(snapshot_path):
+        return True
+
+    start_hour, end_hour = INVENTORY_SNAPSHOT_OFF_HOURS
+    if end_hour <= now.hour < start_hour:
+        return False
+
+    age = now - datetime.fromtimestamp(os.path.getmtime(snapshot_path))
+    return age > timedelta(hours=INVENTORY_SNAPSHOT_MAX_AGE)
@@ -1,10 +1,12 @@
 import logging
-import os
 import pandas as pd
 from database_functions.funcoes_base import download, save_to_excel
 from database_functions.queries import query_busca, query_resultado, query_resultado_cod_item
+from main_functions.analise_inventario import load_inventory_snapshot
+from database_functions.timing import timed
 
 
+@timed()
 def search_function(user_search):
     """
     Execute a search based on the user's input.
@@ -27,45 +29,38 @@ def search_function(user_search):
     logger.info("Starting the search process.")
 
     # Use the 'download' function to execute the initial search query
-    search_results = download(query_busca, (user_search,))
+    search_results = download(query_busca, (user_search,), family='lookup')
 
     # Check if search results are valid and the required column exists
     if (search_results.empty or 'B1_ZGRUPO' not in search_results.columns or
             not search_results.iloc[0]['B1_ZGRUPO'].strip()):
-        data_frame = download(query_resultado_cod_item, (user_search,))
+        data_frame = download(query_resultado_cod_item, (user_search,), family='lookup')
         return data_frame
 
     # Extract the group ID from the initial search results
     group_id = search_results.iloc[0]['B1_ZGRUPO']
 
     # Use the 'download' function to retrieve the final data set based on the group ID
-    data_frame = download(query_resultado, (group_id,))
+    data_frame = download(query_resultado, (group_id,), family='lookup')
 
     # If the final data set is successfully retrieved, perform additional operations
     if not data_frame.empty:
         try:
-            # Define the path to the Excel file within the 'params' folder at the project's root
-            inv_file_path = os.path.join('params', 'inv_df.xlsx')
-
-            inv_df = pd.read_excel(inv_file_path)
+            # Inventory analysis snapshot indexed by ('Agrupamento', 'Filial')
+            inv_df = load_inventory_snapshot()
 
             # Convert the group ID columns to string to ensure matching types
             data_frame['Agrupamento'] = data_frame['Agrupamento'].astype(str)
-            inv_df['Agrupamento'] = inv_df['Agrupamento'].astype(str)
-            inv_df['Filial'] = inv_df['Filial'].astype(str).str.zfill(4)
             data_frame['Filial'] = data_frame['Filial'].astype(str).str.zfill(4)
 
-            columns_to_drop = ['Descrição', 'Grupo', 'Estoque']
-            inv_df = inv_df.drop(columns=columns_to_drop)
-
-            merged_df = data_frame.merge(inv_df[['Agrupamento', 'Filial', 'Ind. Stk', 'min', 'max', 'Segurança', 'Nota',
-                                                 'Vendas no período', 'Demanda no período']],
-                                         on=['Agrupamento', 'Filial'], how='left')
+            merged_df = data_frame.join(inv_df[['Ind. Stk', 'min', 'max', 'Segurança', 'Nota',
+                                                'Vendas no período', 'Demanda no período']],
+                                        on=['Agrupamento', 'Filial'], how='left')
 
             merged_df.fillna(0, inplace=True)
 
             # Log the completion of the process and return the merged DataFrame
-            logger.info(f"Search complete with {len(merged_df)} results, additional data merged from local Excel file.")
+            logger.info(f"Search complete with {len(merged_df)} results, additional data merged from the inventory snapshot.")
             return merged_df
 
         except Exception as e:
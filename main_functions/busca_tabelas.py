@@ -2,21 +2,30 @@ import logging
 import os
 import pandas as pd
 from database_functions.funcoes_base import download, save_to_excel
-from database_functions.queries import search_table, table_result
+from database_functions.catalog import table_catalog, apply_catalog_dtypes
+from database_functions.query_builder import build_select, table_columns
+from database_functions.timing import timed
 
+# Rows returned by a table preview when the caller does not choose
+PREVIEW_ROWS = 200
 
+# Date columns of the Protheus tables usable as a period filter, in order of preference, after the table prefix
+DATE_COLUMN_SUFFIXES = ['EMISSAO', 'DTDIGIT', 'DATA', 'DATPRF']
+
+
+@timed()
 def get_table_columns(user_table_search):
     """
     Execute a search based on the user's input.
 
-    This function takes in a user's search term, executes a preliminary search to find
-    the table and returns the column names
+    This function takes in a user's search term, finds the table in the local schema catalog,
+    reading its columns from the database when they are not cached, and returns the column names
 
     Parameters:
     - user_search (str): The user's inputted table.
 
     Returns:
-    - pd.DataFrame: A dataframe containing the search results.
+    - dict: Column names, in table order, mapped to their SX3 title, or None if the table was not found.
     """
 
     # Get a logger
@@ -25,20 +34,95 @@ def get_table_columns(user_table_search):
     # Log the start of the search process
     logger.info("Starting the table search process.")
 
-    # Use the 'download' function to execute the initial search query
-    query = search_table(user_table_search)
-    search_results = download(query)
+    # Read the columns from the schema catalog
+    catalog_df = table_catalog(user_table_search)
 
     # Check if search results are valid and the required column exists
-    if search_results is None or search_results.empty:
+    if catalog_df.empty:
         logger.error("No results found for the search.")
         return
     else:
-        column_names = search_results.columns.tolist()
+        # Columns missing from SX3 get no title, whatever the dtype of the missing values
+        titles = catalog_df['X3_TITULO'].fillna('').astype(str).str.strip()
+        column_names = {column: title or None for column, title in zip(catalog_df['COLUMN_NAME'], titles)}
         return column_names
 
 
-def download_save_table(columns, table):
-    query = table_result(columns, table)
-    table_df = download(query)
+def table_prefix(table):
+    """
+    Get the column prefix of a Protheus table: 'C7' for SC7010, 'ZZ1' for ZZ1010.
+
+    Parameters:
+    - table (str): The table name.
+
+    Returns:
+    - str: The prefix of the column names.
+    """
+    alias = table[:3].upper()
+    return alias[1:] if alias.startswith('S') else alias
+
+
+def table_filters(table, filial=None, date_from=None, date_to=None):
+    """
+    Build the WHERE conditions of the branch and period filters of a table.
+
+    The filters only use the indexed branch column and the emission date column of the table,
+    and are skipped when the table has no such column.
+
+    Parameters:
+    - table (str): The table name.
+    - filial (str, optional): Branch code, None or 'Todas' for every branch.
+    - date_from (date, optional): First day of the period.
+    - date_to (date, optional): Last day of the period.
+
+    Returns:
+    - list: (column, operator, value) conditions for build_select.
+    """
+    prefix = table_prefix(table)
+    available_columns = set(table_columns(table))
+    conditions = []
+
+    filial_column = f"{prefix}_FILIAL"
+    if filial and filial != 'Todas' and filial_column in available_columns:
+        conditions.append((filial_column, '=', filial))
+
+    date_column = next((f"{prefix}_{suffix}" for suffix in DATE_COLUMN_SUFFIXES
+                        if f"{prefix}_{suffix}" in available_columns), None)
+    if date_column is not None:
+        # Protheus stores dates as YYYYMMDD strings
+        if date_from is not None:
+            conditions.append((date_column, '>=', date_from.strftime('%Y%m%d')))
+        if date_to is not None:
+            conditions.append((date_column, '<=', date_to.strftime('%Y%m%d')))
+
+    return conditions
+
+
+@timed()
+def preview_table(columns, table, filial=None, date_from=None, date_to=None, limit=PREVIEW_ROWS):
+    """
+    Fetch the first rows of the selected columns of a table, with the branch and period filters.
+
+    Parameters:
+    - columns (list): Column names.
+    - table (str): The table name.
+    - filial (str, optional): Branch code, None or 'Todas' for every branch.
+    - date_from (date, optional): First day of the period.
+    - date_to (date, optional): Last day of the period.
+    - limit (int, optional): Maximum number of rows. Defaults to PREVIEW_ROWS.
+
+    Returns:
+    - pd.DataFrame: The preview rows.
+    """
+    query, params = build_select(table, columns, where=table_filters(table, filial, date_from, date_to),
+                                 top=limit)
+    preview_df = download(query, params, family='lookup')
+    return apply_catalog_dtypes(preview_df, table_catalog(table))
+
+
+@timed()
+def download_save_table(columns, table, filial=None, date_from=None, date_to=None):
+    query, params = build_select(table, columns, where=table_filters(table, filial, date_from, date_to))
+    table_df = download(query, params or None, family='export')
+    table_df = apply_catalog_dtypes(table_df, table_catalog(table))
     save_to_excel(table_df, f"{table}", "table", True)
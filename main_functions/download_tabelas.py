@@ -2,15 +2,20 @@ import pandas as pd
 from openpyxl.styles import numbers
 import numpy as np
 import logging
-from database_functions.funcoes_base import download, save_to_excel
+from database_functions.funcoes_base import download, download_chunks, save_to_excel, BranchWorkbook
 from database_functions.queries import pedidos, faturamento, saldo_analitico
 from main_functions.processamento import classify_stock_items
+from database_functions.timing import timed
 
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Invoice lines fetched, transformed and written at a time by the faturamento export
+FATURAMENTO_CHUNK_SIZE = 50000
 
-def download_saldo(filial, open_flag):
+
+@timed()
+def download_saldo(filial, open_flag, workbook=None):
     """
     Downloads and processes data for the saldo_analitico query, and saves the result to an Excel file.
 
@@ -21,6 +26,7 @@ def download_saldo(filial, open_flag):
 
     Parameters:
     filial (str): The filial (branch) code to be used as a parameter in the saldo_analitico SQL query.
+    workbook (BranchWorkbook, optional): If given, the result is written as a sheet of this workbook.
 
     Returns:
     None: The result is saved to an Excel file, and the file is opened for viewing.
@@ -32,10 +38,13 @@ def download_saldo(filial, open_flag):
     try:
         # Use the download function to execute the SQL query and store the result in a DataFrame
         params = (filial, filial)
-        data_frame = download(saldo_analitico, params)
+        data_frame = download(saldo_analitico, params, family='export')
         logger.info(f"Downloaded {data_frame.shape[0]} rows of data for saldo_analitico.")
     except Exception as e:
         logger.error(f"An error occurred during download: {str(e)}")
+        if workbook is not None:
+            # The branch sheet would be missing, let the caller discard the consolidated workbook
+            raise
         return
 
     # Rename columns
@@ -61,17 +70,22 @@ def download_saldo(filial, open_flag):
     final_df = final_df.drop_duplicates()
 
     try:
-        # Save DataFrame to Excel and open the file
-        if open_flag:
+        # Write the branch sheet when consolidating, otherwise save DataFrame to Excel and open the file
+        if workbook is not None:
+            workbook.write_sheet(final_df, filial)
+        elif open_flag:
             save_to_excel(final_df, 'saldo_analítico', filial, open_file=True)
         else:
             save_to_excel(final_df, 'saldo_analítico', filial, open_file=False)
     except Exception as e:
         logger.error(f"An error occurred while saving to Excel: {str(e)}")
+        if workbook is not None:
+            raise
         return
 
 
-def download_pedidos(filial, date, open_flag):
+@timed()
+def download_pedidos(filial, date, open_flag, workbook=None):
     """
     Downloads and processes data for the pedidos query, and saves the result to an Excel file.
 
@@ -81,6 +95,7 @@ def download_pedidos(filial, date, open_flag):
 
     Parameters:
     filial (str): The filial (branch) code to be used as a parameter in the pedidos SQL query.
+    workbook (BranchWorkbook, optional): If given, the result is written as a sheet of this workbook.
 
     Returns:
     None: The result is saved to an Excel file, and the file is opened for viewing.
@@ -96,10 +111,13 @@ def download_pedidos(filial, date, open_flag):
     try:
         # Use the download function to execute the SQL query and store the result in a DataFrame
         params = (date_str, filial)
-        data_frame = download(pedidos, params)
+        data_frame = download(pedidos, params, family='export')
         logger.info(f"Downloaded {data_frame.shape[0]} rows of data for pedidos.")
     except Exception as e:
         logger.error(f"An error occurred during download: {str(e)}")
+        if workbook is not None:
+            # The branch sheet would be missing, let the caller discard the consolidated workbook
+            raise
         return
     # Rename columns
     column_mapping = {
@@ -146,47 +164,32 @@ def download_pedidos(filial, date, open_flag):
     final_df = final_df.drop_duplicates()
 
     try:
-        # Save DataFrame to Excel and open the file
-        if open_flag:
+        # Write the branch sheet when consolidating, otherwise save DataFrame to Excel and open the file
+        if workbook is not None:
+            workbook.write_sheet(final_df, filial)
+        elif open_flag:
             save_to_excel(final_df, 'pedidos', filial, open_file=True)
         else:
             save_to_excel(final_df, 'pedidos', filial, open_file=False)
     except Exception as e:
         logger.error(f"An error occurred while saving to Excel: {str(e)}")
+        if workbook is not None:
+            raise
         return
 
 
-def download_faturamento(filial, date, open_flag):
+def transform_faturamento(data_frame):
     """
-    Downloads and processes data for the faturamento query, and saves the result to an Excel file.
-
-    The function downloads data using the faturamento SQL query for a specific filial (branch), then processes
-    the data to prepare it for output to an Excel file. This includes renaming columns, replacing blank strings
-    with NaN, aggregating values, and calculating the 'valor unitario'.
+    Prepare a chunk of the faturamento query for the Excel file: rename the columns, replace blank strings
+    with NaN, strip the codes and descriptions, convert the numbers and dates and calculate the
+    'Valor unitário'.
 
     Parameters:
-    filial (str): The filial (branch) code to be used as a parameter in the faturamento SQL query.
+    - data_frame (DataFrame): Rows of the faturamento query.
 
     Returns:
-    None: The result is saved to an Excel file, and the file may be opened for viewing if specified.
+    - DataFrame: The prepared rows.
     """
-
-    # Log the start of the download process
-    logger.info("Starting the download process for faturamento.")
-
-    # Convert the date to string for the Query
-    date_fat = date.strftime("%Y%m%d")
-
-    # Try to download the data, catch any exceptions
-    try:
-        # Use the download function to execute the SQL query and store the result in a DataFrame
-        params = (date_fat, filial)
-        data_frame = download(faturamento, params)
-        logger.info(f"Downloaded {data_frame.shape[0]} rows of data for faturamento.")
-    except Exception as e:
-        logger.error(f"An error occurred during download: {str(e)}")
-        return
-
     column_mapping = {
         "D2_EMISSAO": "Data",
         "B1_ZGRUPO": "Agrupamento",
@@ -202,7 +205,7 @@ def download_faturamento(filial, date, open_flag):
         "D2_MARGEM": "Margem"
     }
     # Rename columns
-    data_frame.rename(columns=column_mapping, inplace=True)
+    data_frame = data_frame.rename(columns=column_mapping)
 
     # Replace blank strings with NaN
     data_frame.replace(r'^\s*$', np.nan, regex=True, inplace=True)
@@ -221,21 +224,80 @@ def download_faturamento(filial, date, open_flag):
     # Calculate 'valor unitario'
     data_frame['Valor unitário'] = (data_frame['Val Faturado Bruto'] / data_frame['Quantidade']).round(2)
 
-    data_frame = data_frame.drop_duplicates()
+    return data_frame
+
+
+def faturamento_chunks(filial, date, chunksize=FATURAMENTO_CHUNK_SIZE):
+    """
+    Stream the prepared faturamento rows of a branch, one chunk at a time.
+
+    Repeated rows are dropped after the preparation, as drop_duplicates would on the whole result: the
+    keys of the rows already yielded are kept for the branch, so a row repeating one of an earlier chunk
+    is dropped as well. The query itself stays a plain SELECT, so the first chunk is not held back.
+
+    Parameters:
+    - filial (str): The filial (branch) code.
+    - date (date): First emission date.
+    - chunksize (int, optional): Rows per chunk. Defaults to FATURAMENTO_CHUNK_SIZE.
+
+    Yields:
+    - DataFrame: The next prepared rows.
+    """
+    # Convert the date to string for the Query
+    date_fat = date.strftime("%Y%m%d")
+
+    seen = set()
+    for chunk in download_chunks(faturamento, (date_fat, filial), family='export', chunksize=chunksize):
+        chunk = transform_faturamento(chunk).drop_duplicates()
+
+        # Compare whole rows with every missing value as None, so NaN keys match across chunks
+        keys = list(chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None))
+        is_new = [key not in seen for key in keys]
+        seen.update(keys)
+        yield chunk[is_new]
+
+
+@timed()
+def download_faturamento(filial, date, open_flag, workbook=None):
+    """
+    Downloads and processes data for the faturamento query, and saves the result to an Excel file.
+
+    The invoice lines are streamed in chunks: each chunk is fetched, prepared by transform_faturamento and
+    appended to a write-only sheet before the next one is fetched, so only one chunk and the keys of the
+    rows already written are held in memory.
+
+    Parameters:
+    filial (str): The filial (branch) code to be used as a parameter in the faturamento SQL query.
+    workbook (BranchWorkbook, optional): If given, the result is written as a sheet of this workbook.
+
+    Returns:
+    None: The result is saved to an Excel file, and the file may be opened for viewing if specified.
+    """
+
+    # Log the start of the download process
+    logger.info("Starting the download process for faturamento.")
+
+    # Write the branch sheet when consolidating, otherwise stream to a file of its own and optionally open it
+    output = workbook if workbook is not None else BranchWorkbook('faturamento', filial, open_file=open_flag)
 
     try:
-        # Save DataFrame to Excel and optionally open the file
-        if open_flag:
-            save_to_excel(data_frame, 'faturamento', filial, open_file=True)
-        else:
-            save_to_excel(data_frame, 'faturamento', filial, open_file=False)
+        rows = output.write_chunks(faturamento_chunks(filial, date), filial)
+        logger.info(f"Wrote {rows} rows of data for faturamento.")
     except Exception as e:
-        logger.error(f"An error occurred while saving to Excel: {str(e)}")
+        logger.error(f"An error occurred while streaming faturamento for {filial}: {str(e)}")
+        if workbook is not None:
+            # The sheet is incomplete, let the caller discard the consolidated workbook
+            raise
         return
 
+    if workbook is None:
+        output.close()
+
 
 # noinspection PyShadowingNames
-def download_tabelas(filial, saldo, pedidos, faturamento, pedidos_selected_date, faturamento_selected_date):
+@timed()
+def download_tabelas(filial, saldo, pedidos, faturamento, pedidos_selected_date, faturamento_selected_date,
+                     consolidated=False):
     """
     Downloads and processes data for specified queries and saves the results to Excel files.
 
@@ -248,6 +310,8 @@ def download_tabelas(filial, saldo, pedidos, faturamento, pedidos_selected_date,
     saldo (bool): If True, executes the download_saldo function for the saldo_analitico query.
     pedidos (bool): If True, executes the download_pedidos function for the pedidos query.
     faturamento (bool): If True, executes the download_faturamento function for the faturamento query.
+    consolidated (bool, optional): When processing 'Todas', write one workbook per query with one sheet per
+    branch instead of one file per branch. Defaults to False.
 
     Returns:
     None: The results are saved to Excel files and may be opened for viewing if specified in the individual functions.
@@ -265,20 +329,37 @@ def download_tabelas(filial, saldo, pedidos, faturamento, pedidos_selected_date,
     else:
         filials_to_process = [filial]
         open_flag = True
+        consolidated = False
 
-    for current_filial in filials_to_process:
-        logger.info(f"Starting the download process for filial: {current_filial}")
+    # One streamed workbook per selected query, each branch becomes a sheet
+    workbooks = {}
+    if consolidated:
+        selected = {'saldo_analítico': saldo, 'pedidos': pedidos, 'faturamento': faturamento}
+        workbooks = {name: BranchWorkbook(name, filial) for name, flag in selected.items() if flag}
 
-        # Download data for the saldo_analitico query if requested
-        if saldo:
-            download_saldo(current_filial, open_flag)
-
-        # Download data for the pedidos query if requested
-        if pedidos:
-            download_pedidos(current_filial, pedidos_selected_date, open_flag)
-
-        # Download data for the faturamento query if requested
-        if faturamento:
-            download_faturamento(current_filial, faturamento_selected_date, open_flag)
+    try:
+        for current_filial in filials_to_process:
+            logger.info(f"Starting the download process for filial: {current_filial}")
+
+            # Download data for the saldo_analitico query if requested
+            if saldo:
+                download_saldo(current_filial, open_flag, workbooks.get('saldo_analítico'))
+
+            # Download data for the pedidos query if requested
+            if pedidos:
+                download_pedidos(current_filial, pedidos_selected_date, open_flag, workbooks.get('pedidos'))
+
+            # Download data for the faturamento query if requested
+            if faturamento:
+                download_faturamento(current_filial, faturamento_selected_date, open_flag,
+                                     workbooks.get('faturamento'))
+    except Exception:
+        # Drop the consolidated workbooks instead of saving truncated files
+        for workbook in workbooks.values():
+            workbook.discard()
+        raise
+
+    for workbook in workbooks.values():
+        workbook.close()
 
     logger.info("Download process completed.")
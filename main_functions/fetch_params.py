@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import logging
+from database_functions.timing import timed
 
 # Get a logger
 logger = logging.getLogger(__name__)
@@ -34,6 +35,7 @@ def simplify_columns(df):
     return df
 
 
+@timed()
 def merge_sheets(filial, local_folder="params", file_name="Dados_Sug.xlsx"):
 
     excel_path = os.path.join(local_folder, file_name)
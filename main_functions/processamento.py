@@ -3,17 +3,25 @@ import numpy as np
 import os
 import math
 import logging
+from database_functions.params_update import save_frame_locally, load_frame_locally
+from database_functions.timing import timed
 
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Local store holding the 'Ind. Stk' indicator computed when Base_df is built
+STOCK_INDICATOR_FILE = "ind_stk.pkl"
 
-def calculate_grades(data_frame):
+
+@timed()
+def calculate_grades(data_frame, recent_months=3, window_months=5):
     """
     Calculate grades for sales data based on defined rules.
     
     Parameters:
     - data_frame (DataFrame): Sales data where columns include date periods and rows represent individual sales.
+    - recent_months (int, optional): Number of trailing months used by rules 1 and 2. Defaults to 3.
+    - window_months (int, optional): Number of trailing months used by rule 3. Defaults to 5.
 
     Returns:
     - DataFrame: Data with an additional 'grade' column indicating the calculated grade.
@@ -23,23 +31,24 @@ def calculate_grades(data_frame):
     - Grade 2: Sales in at least two of the last three months.
     - Grade 1: Sales in at least three of the last five months, and no zero sales for two consecutive months.
     - Default Grade 0: If none of the above conditions is met.
+
+    The month windows are taken from the trailing period columns, so any number of month columns is supported.
     """
-    # Extract columns that are date periods.
-    date_columns = [col for col in data_frame.columns if isinstance(col, pd._libs.tslibs.period.Period)]
-    date_df = data_frame[date_columns]
+    # Extract columns that are date periods, oldest first, as an (n_items, n_months) array.
+    date_columns = sorted(col for col in data_frame.columns if isinstance(col, pd.Period))
+    window = data_frame[date_columns].to_numpy(dtype=float)[:, -window_months:]
+    has_sales = window != 0
 
     # Rule 1: Check sales in all of the last three months.
-    last_three_months = date_df.iloc[:, 2:5]
-    rule_1_condition = (last_three_months != 0).all(axis=1)
+    recent_sales = has_sales[:, -recent_months:]
+    rule_1_condition = recent_sales.all(axis=1)
 
     # Rule 2: Check sales in at least two of the last three months.
-    last_three_months_check = (date_df.iloc[:, 2:5] != 0).sum(axis=1).ge(2)
-    rule_2_condition = last_three_months_check
+    rule_2_condition = recent_sales.sum(axis=1) >= 2
 
     # Rule 3: Check sales in at least three of the last five months and no zero sales for two consecutive months.
-    three_of_five_months_check = (date_df != 0).sum(axis=1).ge(3)
-    rolled_sum = date_df.T.rolling(window=2).sum().T
-    no_consecutive_zeros = (rolled_sum != 0).all(axis=1)
+    three_of_five_months_check = has_sales.sum(axis=1) >= 3
+    no_consecutive_zeros = ((window[:, :-1] + window[:, 1:]) != 0).all(axis=1)
     rule_3_condition = three_of_five_months_check & no_consecutive_zeros
 
     # Create conditions list for grade assignment.
@@ -56,6 +65,7 @@ def calculate_grades(data_frame):
     return data_frame
 
 
+@timed()
 def calculate_min_max_columns(data_frame):
     """
     Calculate the 'min' and 'max' columns for the given data frame based on predefined rules.
@@ -103,6 +113,7 @@ def calculate_min_max_columns(data_frame):
     return data_frame
 
 
+@timed()
 def calculate_stock_suggestion(data_frame):
     """
     Calculate the 'stock_suggestion' column based on the given rules.
@@ -138,54 +149,95 @@ def calculate_stock_suggestion(data_frame):
     return data_frame
 
 
-def classify_stock_items(data_frame):
-    data_file_path = os.path.join('params', 'Base_df.xlsx')
-    data_df = pd.read_excel(data_file_path)
+def compute_stock_indicator(base_df):
+    """
+    Compute the 'Ind. Stk' stock indicator for every 'Agrupamento' and 'Filial' pair of Base_df.
+
+    Parameters:
+    - base_df (DataFrame): The Base_df data, with 'N_comprar', 'Segurança' and 'Nota' columns.
 
+    Returns:
+    - Series: The 'Ind. Stk' values indexed by ('Agrupamento', 'Filial').
+    """
+    data_df = base_df[['Agrupamento', 'Filial', 'N_comprar', 'Segurança', 'Nota']].copy()
     data_df['Filial'] = data_df['Filial'].astype(str).str.zfill(4)
 
-    # Check if 'Ind. Stk' column already exists
-    if 'Ind. Stk' not in data_df.columns:
-        # Fill NaN values in specified columns with 0
-        columns_to_fill = ['N_comprar', 'Segurança', 'Nota']
-        for column in columns_to_fill:
-            data_df[column] = data_df[column].fillna(0)
-
-        data_df['Ind. Stk'] = np.nan  # Ensure 'Ind. Stk' column is initially set to NaN
-
-        # Function to determine 'Ind. Stk' value for each group
-        def determine_ind_stk(group):
-            if (group['N_comprar'] == 1).any():
-                result = 'NB'
-            elif group['Nota'].isin([2, 3]).any():
-                result = 'EN'
-            elif ((group['Nota'].isin([0, 1])) & (group['Segurança'] > 0)).any():
-                result = 'EB'
-            elif ((group['Nota'].isin([0, 1])) & (group['Segurança'] == 0)).any():
-                result = 'NE'
-            else:
-                result = np.nan
-            return result
-
-        # Apply the function to each 'Agrupamento' and 'Filial' group and assign the result to the 'Ind. Stk' column
-        group_results = data_df.groupby(['Agrupamento', 'Filial']).apply(determine_ind_stk)
-        group_results.name = 'Ind. Stk'  # Set the name of the Series directly
-
-        # Merge the group results back to the data_df
-        data_df = data_df.merge(group_results, on=['Agrupamento', 'Filial'], how='left')
-
-        # Remove the 'Ind. Stk_x' column if it exists and rename 'Ind. Stk_y' to 'Ind. Stk'
-        if 'Ind. Stk_x' in data_df.columns:
-            data_df.drop(columns=['Ind. Stk_x'], inplace=True)
-        if 'Ind. Stk_y' in data_df.columns:
-            data_df.rename(columns={'Ind. Stk_y': 'Ind. Stk'}, inplace=True)
-
-        data_df.to_excel(data_file_path, index=False)  # Save the modified DataFrame
-
-    # Convert 'Filial' in data_df to object to match data_frame
-    data_df['Filial'] = data_df['Filial'].astype(object)
-
-    # Merge with the provided data_frame on 'Agrupamento' and 'Filial'
-    merged_df = pd.merge(data_frame, data_df[['Agrupamento', 'Filial', 'Ind. Stk']], on=['Agrupamento', 'Filial'], how='left')
+    # Fill NaN values in specified columns with 0
+    columns_to_fill = ['N_comprar', 'Segurança', 'Nota']
+    for column in columns_to_fill:
+        data_df[column] = data_df[column].fillna(0)
+
+    # Row conditions of each indicator, in priority order
+    low_grade = data_df['Nota'].isin([0, 1])
+    data_df['NB'] = data_df['N_comprar'] == 1
+    data_df['EN'] = data_df['Nota'].isin([2, 3])
+    data_df['EB'] = low_grade & (data_df['Segurança'] > 0)
+    data_df['NE'] = low_grade & (data_df['Segurança'] == 0)
+
+    # A group gets the first indicator any of its rows meets
+    indicators = ['NB', 'EN', 'EB', 'NE']
+    group_flags = data_df.groupby(['Agrupamento', 'Filial'])[indicators].any()
+    group_results = pd.Series(np.select([group_flags[name] for name in indicators], indicators, default=''),
+                              index=group_flags.index, name='Ind. Stk').replace('', np.nan)
+
+    return group_results
+
+
+def save_stock_indicator(base_df):
+    """
+    Compute the stock indicator once, when Base_df is built, and keep it in the local store.
+
+    Parameters:
+    - base_df (DataFrame): The freshly built Base_df data.
+    """
+    stock_indicator = compute_stock_indicator(base_df)
+    save_frame_locally(STOCK_INDICATOR_FILE, stock_indicator.to_frame())
+
+
+def load_stock_indicator():
+    """
+    Get the in-memory 'Ind. Stk' lookup keyed by ('Agrupamento', 'Filial').
+
+    The lookup is read from the local store once and reused until the store changes. If the store does
+    not exist yet it is built from Base_df.xlsx, which is only read, never rewritten.
+
+    Returns:
+    - Series: The 'Ind. Stk' values indexed by ('Agrupamento', 'Filial'), empty if the store cannot be read.
+    """
+    if not os.path.exists(os.path.join('params', STOCK_INDICATOR_FILE)):
+        logger.info("Stock indicator store not found, building it from Base_df.xlsx.")
+        base_df = pd.read_excel(os.path.join('params', 'Base_df.xlsx'))
+        if 'Ind. Stk' in base_df.columns:
+            base_df['Filial'] = base_df['Filial'].astype(str).str.zfill(4)
+            stock_indicator = base_df.groupby(['Agrupamento', 'Filial'])['Ind. Stk'].first()
+            save_frame_locally(STOCK_INDICATOR_FILE, stock_indicator.to_frame())
+        else:
+            save_stock_indicator(base_df)
+
+    stock_indicator = load_frame_locally(STOCK_INDICATOR_FILE, cached=True)
+    if stock_indicator is None:
+        # Leave 'Ind. Stk' empty rather than failing the export
+        logger.error(f"Could not read the stock indicator store {STOCK_INDICATOR_FILE}, 'Ind. Stk' is left empty.")
+        empty_index = pd.MultiIndex.from_arrays([[], []], names=['Agrupamento', 'Filial'])
+        return pd.Series(index=empty_index, dtype=object, name='Ind. Stk')
+
+    return stock_indicator['Ind. Stk']
+
+
+@timed()
+def classify_stock_items(data_frame):
+    """
+    Add the 'Ind. Stk' column to a data frame using the in-memory stock indicator lookup.
+
+    Parameters:
+    - data_frame (DataFrame): Data with 'Agrupamento' and 'Filial' columns.
+
+    Returns:
+    - DataFrame: The data with the 'Ind. Stk' column.
+    """
+    stock_indicator = load_stock_indicator()
+
+    # Join on 'Agrupamento' and 'Filial' against the indexed lookup
+    merged_df = data_frame.join(stock_indicator, on=['Agrupamento', 'Filial'], how='left')
 
     return merged_df
@@ -1,14 +1,24 @@
 import pandas as pd
 import numpy as np
 import logging
-from database_functions.funcoes_base import download, save_to_excel
+import functools
+from database_functions.async_access import concurrent_calls
+from database_functions.db_connect import config_flag
+from database_functions.funcoes_base import download, save_to_excel, BranchWorkbook
 from main_functions.fetch_params import merge_sheets
-from main_functions.processamento import calculate_grades, calculate_min_max_columns, calculate_stock_suggestion
-from database_functions.queries import info_gerais, historico_faturamento, quantidade_receber
+from main_functions.processamento import (calculate_grades, calculate_min_max_columns, calculate_stock_suggestion,
+                                         save_stock_indicator)
+from database_functions.params_update import save_excel_locally
+from database_functions.queries import (info_gerais, historico_faturamento, historico_faturamento_mensal,
+                                        quantidade_receber)
+from database_functions.timing import timed
 
 # Get a logger
 logger = logging.getLogger(__name__)
 
+# Number of months of sales history, before the current month, used for the grades and averages
+HISTORY_MONTHS = 4
+
 
 def download_method(query, params):
     """
@@ -22,12 +32,13 @@ def download_method(query, params):
     Returns:
     - DataFrame: Filtered data.
     """
-    data_frame = download(query, params)
+    data_frame = download(query, params, family='history')
     # Remove rows where 'B1_ZGRUPO' is missing, null, or an empty string
     data_frame = data_frame[data_frame['B1_ZGRUPO'].str.strip() != '']
     return data_frame
 
 
+@timed()
 def general_information(filial):
     """
     Fetch and process the general information data frame for a specific branch (filial).
@@ -60,6 +71,7 @@ def general_information(filial):
     return gi_data_frame
 
 
+@timed()
 def orders(filial):
     """
     Fetch and process the order information data frame for a specific branch (filial).
@@ -87,26 +99,37 @@ def orders(filial):
     return o_data_frame
 
 
-def fat_history(filial):
+@timed()
+def fat_history(filial, months=HISTORY_MONTHS, aggregate_on_server=True):
     """
     Fetch and process the fat_history information for a specific branch (filial).
     
     Parameters:
     - filial (str): The branch code.
+    - months (int, optional): Number of months of history before the current month. Defaults to HISTORY_MONTHS.
+    - aggregate_on_server (bool, optional): If True, the database returns one row per item and month instead of
+      one row per invoice line. Defaults to True.
 
     Returns:
     - DataFrame: Processed fat_history information.
     """
     logger.info(f"Fetching fat_history for branch {filial}.")
 
-    query = historico_faturamento
-    params = (filial,)
-    fh_data_frame = download_method(query, params)
-
-    # Process columns for datetime and numeric formats
-    fh_data_frame['D2_EMISSAO'] = pd.to_datetime(fh_data_frame['D2_EMISSAO'], format='%Y%m%d', errors='coerce')
-    fh_data_frame['Month_Year'] = fh_data_frame['D2_EMISSAO'].dt.to_period('M')
     column_to_sum = "D2_QUANT"
+    params = (filial, -months)
+
+    if aggregate_on_server:
+        # Monthly sums per item are computed by the database
+        fh_data_frame = download_method(historico_faturamento_mensal, params)
+        fh_data_frame['Month_Year'] = pd.to_datetime(fh_data_frame['ANO_MES'], format='%Y%m',
+                                                     errors='coerce').dt.to_period('M')
+    else:
+        fh_data_frame = download_method(historico_faturamento, params)
+
+        # Process columns for datetime formats
+        fh_data_frame['D2_EMISSAO'] = pd.to_datetime(fh_data_frame['D2_EMISSAO'], format='%Y%m%d', errors='coerce')
+        fh_data_frame['Month_Year'] = fh_data_frame['D2_EMISSAO'].dt.to_period('M')
+
     fh_data_frame[column_to_sum] = fh_data_frame[column_to_sum].apply(pd.to_numeric, errors='coerce')
 
     # Aggregate data
@@ -116,10 +139,15 @@ def fat_history(filial):
     pivot_result = result.pivot_table(index=['B1_ZGRUPO', 'D2_FILIAL'], columns='Month_Year', values=column_to_sum,
                                       fill_value=0, aggfunc='sum')
 
+    # Keep one column per month of the window, even for months without any sales
+    period_columns = pd.period_range(end=pd.Timestamp.today().to_period('M'), periods=months + 1, freq='M')
+    pivot_result = pivot_result.reindex(columns=period_columns, fill_value=0)
+    month_values = pivot_result[period_columns]
+
     # Calculate additional metrics
-    pivot_result['total_sum'] = pivot_result.sum(axis=1)
-    pivot_result['avg_last_two_months'] = np.ceil(pivot_result.iloc[:, -3:-1].mean(axis=1)).astype(int)
-    pivot_result['avg_last_three_months'] = np.ceil(pivot_result.iloc[:, -5:-2].mean(axis=1)).astype(int)
+    pivot_result['total_sum'] = month_values.sum(axis=1)
+    pivot_result['avg_last_two_months'] = np.ceil(month_values.iloc[:, -2:].mean(axis=1)).astype(int)
+    pivot_result['avg_last_three_months'] = np.ceil(month_values.iloc[:, -3:].mean(axis=1)).astype(int)
 
     # Reset the index to make 'B1_ZGRUPO' and 'B1_FILIAL' columns again
     pivot_result = pivot_result.reset_index()
@@ -130,10 +158,41 @@ def fat_history(filial):
     return fh_data_frame
 
 
+def index_by_keys(data_frame):
+    """
+    Standardize the 'Filial' column name and index a data frame by ('B1_ZGRUPO', 'Filial').
+
+    Parameters:
+    - data_frame (DataFrame): Data with 'B1_ZGRUPO' and one of the 'B2_FILIAL', 'D2_FILIAL' or 'C7_FILIAL' columns.
+
+    Returns:
+    - DataFrame: The data indexed by ('B1_ZGRUPO', 'Filial').
+    """
+    # Identify the 'Filial' column in the data frame
+    filial_column = next((col for col in ['B2_FILIAL', 'D2_FILIAL', 'C7_FILIAL'] if col in data_frame.columns), None)
+    if filial_column is None:
+        raise ValueError("Data frame is missing 'Filial' column")
+    if 'B1_ZGRUPO' not in data_frame.columns:
+        raise ValueError("Data frame is missing 'B1_ZGRUPO' column")
+
+    indexed_df = data_frame.rename(columns={filial_column: 'Filial'}).set_index(['B1_ZGRUPO', 'Filial'])
+
+    # An aligned join is only valid when every key appears once
+    if not indexed_df.index.is_unique:
+        duplicated = indexed_df.index.duplicated().sum()
+        raise ValueError(f"Data frame has {duplicated} duplicated ('B1_ZGRUPO', 'Filial') keys")
+
+    return indexed_df
+
+
+@timed()
 def join_parts(*data_frames):
     """
-    Join multiple data frames on 'Agrupamento' and 'Filial' columns.
-    NaN values will be filled with 0.
+    Join multiple data frames on 'B1_ZGRUPO' and 'Filial' columns.
+
+    Every frame is indexed by the keys once and all of them are aligned to the keys of the first
+    frame in a single join. The number of keys without a match in each frame is logged before
+    NaN values are filled with 0.
 
     Parameters:
     - *data_frames (DataFrames): One or more data frames to be joined.
@@ -144,42 +203,40 @@ def join_parts(*data_frames):
     if not data_frames:
         raise ValueError("At least one dataframe must be provided.")
 
-        # Standardize the 'Filial' column name in the first data frame
-    filial_column = next((col for col in ['B2_FILIAL', 'D2_FILIAL', 'C7_FILIAL'] if col in data_frames[0].columns), None)
-    if filial_column is None:
-        raise ValueError("First data frame is missing 'Filial' column")
-    joined_df = data_frames[0].rename(columns={filial_column: 'Filial'})
+    indexed_frames = [index_by_keys(df) for df in data_frames]
+    base_df = indexed_frames[0]
 
-    for df in data_frames[1:]:
-        # Identify the 'Filial' column in the current data frame
-        filial_column = next((col for col in ['B2_FILIAL', 'D2_FILIAL', 'C7_FILIAL'] if col in df.columns), None)
-        if filial_column is None:
-            raise ValueError("Data frame is missing 'Filial' column")
-
-        # Rename the 'Filial' column to a standard name for consistency
-        df = df.rename(columns={filial_column: 'Filial'})
-
-        # Check for 'B1_ZGRUPO' column and merge
-        if 'B1_ZGRUPO' in df.columns:
-            joined_df = pd.merge(joined_df, df, on=['B1_ZGRUPO', 'Filial'], how='left')
-        else:
-            raise ValueError("Data frame is missing 'B1_ZGRUPO' column")
+    # Report keys of the first frame that are missing from the others
+    for position, df in enumerate(indexed_frames[1:], start=1):
+        unmatched = (~base_df.index.isin(df.index)).sum()
+        if unmatched:
+            logger.info(f"join_parts: {unmatched} of {len(base_df)} keys have no match in data frame {position}.")
 
+    # Align every other frame to the keys of the first one and concatenate them in a single step
+    aligned_frames = [df.reindex(base_df.index) for df in indexed_frames[1:]]
+    joined_df = pd.concat([base_df] + aligned_frames, axis=1).reset_index()
     joined_df.fillna(0, inplace=True)
     return joined_df
 
 
-def create_final_df(filial, func):
+@timed()
+def create_final_df(filial, func, consolidated=False, concurrent_fetch=None):
     """
     Create the final data frame by merging and computing different columns.
 
     Parameters:
     - filial (str): The specific branch or 'Todas' for all branches.
     - func (bool): Flag to indicate whether to save the results to Excel.
+    - consolidated (bool, optional): When saving 'Todas', stream each branch to its own sheet of a single
+      workbook instead of concatenating all branches. Defaults to False.
+    - concurrent_fetch (bool, optional): Run the general information, orders and sales history queries of a
+      branch at the same time. Defaults to the 'concurrent' option of the [fetch] section of db_config.ini,
+      off when it is not set.
 
     Returns:
-    - pd.DataFrame: The final data frame.
+    - pd.DataFrame: The final data frame, or None when the branches were streamed to a consolidated workbook.
     """
+    concurrent_fetch = config_flag('fetch', 'concurrent', concurrent_fetch, fallback=False)
 
     # Define a list of all branches
     all_filials = ['0101', '0103', '0104', "0105"]
@@ -191,12 +248,24 @@ def create_final_df(filial, func):
 
     aggregated_df = pd.DataFrame()
 
+    # Stream each branch into its own sheet so only one branch is kept in memory
+    workbook = None
+    if func and consolidated and filial == 'Todas':
+        workbook = BranchWorkbook("sugestão_compra_Todas", '', open_file=True)
+
     for current_filial in filials_to_process:
         logger.info(f"Creating final data frame for branch {current_filial}.")
 
-        general_info = general_information(current_filial)
-        order_info = orders(current_filial)
-        fat_info = fat_history(current_filial)
+        if concurrent_fetch:
+            general_info, order_info, fat_info = concurrent_calls(
+                functools.partial(general_information, current_filial),
+                functools.partial(orders, current_filial),
+                functools.partial(fat_history, current_filial),
+            )
+        else:
+            general_info = general_information(current_filial)
+            order_info = orders(current_filial)
+            fat_info = fat_history(current_filial)
 
         # Join the tables
         joined_table = join_parts(general_info, order_info, fat_info)
@@ -229,15 +298,24 @@ def create_final_df(filial, func):
         # Rename and map columns as needed
         final_df = final_df.rename(columns=column_mapping_excel)
 
+        # Ensure the 'Filial' column is formatted correctly
+        if 'Filial' in final_df.columns:
+            final_df['Filial'] = final_df['Filial'].astype(str).apply(lambda x: x.zfill(4))
+
+        if workbook is not None:
+            workbook.write_sheet(final_df, current_filial)
+            continue
+
         # Concatenate the current final_df into the aggregated_df
         if aggregated_df.empty:
             aggregated_df = final_df
         else:
             aggregated_df = pd.concat([aggregated_df, final_df], ignore_index=True)
 
-    # Ensure the 'Filial' column is formatted correctly
-    if 'Filial' in aggregated_df.columns:
-        aggregated_df['Filial'] = aggregated_df['Filial'].astype(str).apply(lambda x: x.zfill(4))
+    if workbook is not None:
+        workbook.close()
+        logger.info("Final data frame for all branches saved to a consolidated Excel workbook.")
+        return None
 
     print(aggregated_df.head())
 
@@ -248,3 +326,21 @@ def create_final_df(filial, func):
             f"Final data frame for {'all branches' if filial == 'Todas' else 'branch ' + filial} saved to Excel.")
 
     return aggregated_df
+
+
+@timed()
+def update_base_df():
+    """
+    Build Base_df for every branch, save it to params and store its stock indicator.
+
+    Runs in the worker thread started when the application opens, so the GUI thread only receives the
+    finished data.
+
+    Returns:
+    - DataFrame: The new Base_df data.
+    """
+    base_df = create_final_df('Todas', False)
+    save_excel_locally("Base_df.xlsx", data=base_df)
+    save_stock_indicator(base_df)
+
+    return base_df
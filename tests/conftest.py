@@ -0,0 +1,17 @@
+import configparser
+import os
+import sys
+import pytest
+
+# Let the tests import the application packages from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_config(monkeypatch):
+    """An empty db_config.ini, so every option falls back to its default. Tests may add sections."""
+    from database_functions import db_connect
+
+    config = configparser.ConfigParser()
+    monkeypatch.setattr(db_connect, '_config', config)
+    return config
@@ -0,0 +1,21 @@
+import pytest
+
+from main_functions import analise_inventario
+
+
+def test_snapshot_is_not_rebuilt_when_not_due(monkeypatch):
+    def update_inventory_snapshot():
+        pytest.fail("The snapshot should not be rebuilt")
+
+    # The background check only runs the report when the snapshot is due
+    monkeypatch.setattr(analise_inventario, 'inventory_snapshot_is_due', lambda: False)
+    monkeypatch.setattr(analise_inventario, 'update_inventory_snapshot', update_inventory_snapshot)
+
+    assert analise_inventario.update_inventory_snapshot_if_due() is None
+
+
+def test_snapshot_is_rebuilt_when_due(monkeypatch):
+    monkeypatch.setattr(analise_inventario, 'inventory_snapshot_is_due', lambda: True)
+    monkeypatch.setattr(analise_inventario, 'update_inventory_snapshot', lambda: 'report')
+
+    assert analise_inventario.update_inventory_snapshot_if_due() == 'report'
@@ -0,0 +1,28 @@
+import pytest
+from database_functions import db_connect
+
+
+@pytest.mark.parametrize('family', [None, 'report', 'history', 'export', 'lookup'])
+def test_every_family_defaults_to_the_server_default(db_config, family):
+    assert db_connect.session_options(db_config, family) == (None, False)
+
+
+def test_isolation_and_read_only_intent_are_opted_into(db_config):
+    db_config.read_string("""
+        [isolation]
+        report = snapshot
+        history = READ UNCOMMITTED
+
+        [sql_server]
+        application_intent = ReadOnly
+    """)
+
+    assert db_connect.session_options(db_config, 'report') == ('SNAPSHOT', True)
+    assert db_connect.session_options(db_config, 'history') == ('READ UNCOMMITTED', True)
+    assert db_connect.session_options(db_config, 'lookup') == (None, True)
+
+
+def test_unsupported_isolation_level_keeps_the_server_default(db_config):
+    db_config.read_string("[isolation]\nreport = SERIALIZABLE\n")
+
+    assert db_connect.session_options(db_config, 'report') == (None, False)
@@ -0,0 +1,69 @@
+import datetime
+import pandas as pd
+import pytest
+from database_functions import funcoes_base
+from database_functions.errors import QueryTimeout
+from main_functions import download_tabelas
+
+
+def test_failed_branch_discards_consolidated_workbook(tmp_path, monkeypatch, db_config):
+    monkeypatch.setitem(funcoes_base.output_settings, 'folder', str(tmp_path))
+    monkeypatch.setitem(funcoes_base.output_settings, 'open_files', False)
+    monkeypatch.setattr(download_tabelas, 'classify_stock_items', lambda data_frame: data_frame)
+
+    def fake_download(query, params=None, family=None):
+        if params[0] == '0104':
+            raise QueryTimeout("The export query exceeded its timeout.")
+        return pd.DataFrame({'B1_ZGRUPO': ['0001'], 'B2_FILIAL': [params[0]], 'B2_QATU': [1.0]})
+
+    monkeypatch.setattr(download_tabelas, 'download', fake_download)
+
+    with pytest.raises(QueryTimeout):
+        download_tabelas.download_tabelas('Todas', True, False, False, datetime.date(2024, 1, 1),
+                                          datetime.date(2024, 1, 1), consolidated=True)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_consolidated_workbook_is_saved_when_every_branch_succeeds(tmp_path, monkeypatch, db_config):
+    monkeypatch.setitem(funcoes_base.output_settings, 'folder', str(tmp_path))
+    monkeypatch.setitem(funcoes_base.output_settings, 'open_files', False)
+    monkeypatch.setattr(download_tabelas, 'classify_stock_items', lambda data_frame: data_frame)
+    monkeypatch.setattr(download_tabelas, 'download', lambda query, params=None, family=None: pd.DataFrame(
+        {'B1_ZGRUPO': ['0001'], 'B2_FILIAL': [params[0]], 'B2_QATU': [1.0]}))
+
+    download_tabelas.download_tabelas('Todas', True, False, False, datetime.date(2024, 1, 1),
+                                      datetime.date(2024, 1, 1), consolidated=True)
+
+    assert len(list(tmp_path.glob('saldo_analítico_Todas_*.xlsx'))) == 1
+
+
+def test_faturamento_drops_duplicates_across_chunks(monkeypatch):
+    raw = pd.DataFrame({
+        'D2_EMISSAO': ['20240102', '20240102', '20240103', '20240102', '20240103', '20240104'],
+        'B1_ZGRUPO': ['0001', '0001', '0002', '0001', '0002', None],
+        'D2_COD': ['A1', 'A1 ', 'B2', 'A1', 'B2', 'C3'],
+        'B1_DESC': ['Filtro', 'Filtro', 'Correia', 'Filtro', 'Correia', 'Vela'],
+        'D2_UM': ['PC'] * 6,
+        'D2_TP': ['ME'] * 6,
+        'D2_CLIENTE': ['000001'] * 6,
+        'A1_NOME': ['Cliente'] * 6,
+        'F4_TEXTO': ['VENDA'] * 6,
+        'D2_QUANT': [2, 2, 1, 2, 1, 4],
+        'VFB': [10.0, 10.0, 7.5, 10.0, 7.5, 8.0],
+        'D2_MARGEM': [1.0, 1.0, 0.5, 1.0, 0.5, None],
+    })
+
+    # Chunks of two rows, so the repeated lines fall in other chunks than their first occurrence
+    def fake_download_chunks(query, params=None, family=None, chunksize=None):
+        for start in range(0, len(raw), chunksize):
+            yield raw.iloc[start:start + chunksize].copy()
+
+    monkeypatch.setattr(download_tabelas, 'download_chunks', fake_download_chunks)
+
+    chunks = download_tabelas.faturamento_chunks('0101', datetime.date(2024, 1, 1), chunksize=2)
+    streamed = pd.concat(list(chunks), ignore_index=True)
+    expected = download_tabelas.transform_faturamento(raw.copy()).drop_duplicates().reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(streamed, expected)
+    assert len(streamed) == 3
@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from user_interface.preview_dialog import DataFrameModel  # noqa: E402
+
+
+def test_missing_values_are_shown_as_empty_cells():
+    data_frame = pd.DataFrame({
+        'Quantidade': pd.array([1, pd.NA], dtype='Int64'),
+        'Emissao': pd.to_datetime(['2024-01-02', None]),
+        'Produto': [' 0001 ', None],
+    })
+    model = DataFrameModel(data_frame)
+
+    assert [model.data(model.index(0, column)) for column in range(3)] == ['1', '2024-01-02 00:00:00', '0001']
+    assert [model.data(model.index(1, column)) for column in range(3)] == ['', '', '']
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from main_functions import processamento
+
+
+def test_unreadable_stock_indicator_leaves_column_empty(monkeypatch):
+    monkeypatch.setattr(processamento.os.path, 'exists', lambda path: True)
+    monkeypatch.setattr(processamento, 'load_frame_locally', lambda file_name, cached=False: None)
+
+    data_frame = pd.DataFrame({'Agrupamento': ['0001'], 'Filial': ['0101'], 'Estoque': [3]})
+    classified = processamento.classify_stock_items(data_frame)
+
+    assert list(classified.columns) == ['Agrupamento', 'Filial', 'Estoque', 'Ind. Stk']
+    assert classified['Ind. Stk'].isna().all()
+
+
+def test_compute_stock_indicator_takes_the_first_matching_rule():
+    base_df = pd.DataFrame({
+        'Agrupamento': ['A', 'A', 'B', 'C', 'D', 'E'],
+        'Filial': [101, 101, 101, 101, 101, 101],
+        'N_comprar': [0, 1, 0, 0, np.nan, 0],
+        'Segurança': [0, 0, 0, 2, 0, 0],
+        'Nota': [3, 0, 2, 1, 0, 4],
+    })
+
+    indicator = processamento.compute_stock_indicator(base_df)
+
+    assert indicator.loc[('A', '0101')] == 'NB'
+    assert indicator.loc[('B', '0101')] == 'EN'
+    assert indicator.loc[('C', '0101')] == 'EB'
+    assert indicator.loc[('D', '0101')] == 'NE'
+    assert pd.isna(indicator.loc[('E', '0101')])
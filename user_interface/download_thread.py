@@ -1,28 +1,68 @@
 from PyQt5.QtCore import QThread, pyqtSignal
+import importlib
 import logging
+import threading
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+def lazy_function(module_name, function_name):
+    """
+    Build a callable that imports its module only when it is called.
+
+    Passed to a DownloadThread, the pipeline module and the data stack it depends on are imported
+    by the worker thread instead of delaying the window at startup.
+
+    Parameters:
+    - module_name (str): Module holding the function, e.g. 'main_functions.sugestao_compra'.
+    - function_name (str): Name of the function inside the module.
+
+    Returns:
+    - callable: Function forwarding its arguments to the imported function.
+    """
+    def call(*args, **kwargs):
+        module = importlib.import_module(module_name)
+        return getattr(module, function_name)(*args, **kwargs)
+
+    call.__name__ = function_name
+    return call
+
+
 class DownloadThread(QThread):
     progress_started = pyqtSignal()
     progress_stopped = pyqtSignal()
     finished_with_result = pyqtSignal(object)
+    failed_with_error = pyqtSignal(str)
 
     def __init__(self, func, *args, **kwargs):
         super(DownloadThread, self).__init__()
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.thread_ident = None
+
+    def cancel(self):
+        """
+        Cancel the queries running in this thread at the driver level. The data stack is imported by the
+        worker, so it is only needed here once the thread is running.
+        """
+        if self.thread_ident is None:
+            return
+        from database_functions.cancellation import cancel_active_queries
+        cancel_active_queries(self.thread_ident)
 
     def run(self):
         try:
+            from database_functions.cancellation import clear_cancelled
+            clear_cancelled()
+            self.thread_ident = threading.get_ident()
             self.progress_started.emit()
             result = self.func(*self.args, **self.kwargs)
             self.finished_with_result.emit(result)
             logger.info(f"Successfully executed {self.func.__name__}")
         except Exception as e:
             logger.error(f"Error during execution of {self.func.__name__}: {e}")
+            self.failed_with_error.emit(str(e))
         finally:
             self.progress_stopped.emit()
@@ -1,17 +1,19 @@
 import logging
-import pandas
 from . import resources_rc
 from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QTableWidgetItem, QCheckBox, QVBoxLayout
-from main_functions.download_tabelas import download_tabelas
-from .download_thread import DownloadThread
-from main_functions.sugestao_compra import create_final_df
-from main_functions.busca_produtos import search_function
-from main_functions.analise_inventario import create_report
-from main_functions.busca_tabelas import get_table_columns, download_save_table
+from PyQt5.QtWidgets import QTableWidgetItem, QCheckBox, QVBoxLayout, QMessageBox
+from .download_thread import DownloadThread, lazy_function
+from .preview_dialog import TablePreviewDialog
 
 logger = logging.getLogger(__name__)
 
+# Pipeline functions, imported by the worker threads on first use to keep startup light
+download_tabelas = lazy_function('main_functions.download_tabelas', 'download_tabelas')
+create_final_df = lazy_function('main_functions.sugestao_compra', 'create_final_df')
+search_function = lazy_function('main_functions.busca_produtos', 'search_function')
+create_report = lazy_function('main_functions.analise_inventario', 'create_report')
+get_table_columns = lazy_function('main_functions.busca_tabelas', 'get_table_columns')
+
 
 class BaseLogic:
     def __init__(self, ui):
@@ -21,6 +23,17 @@ class BaseLogic:
     def on_thread_finished(self):
         self.download_thread.deleteLater()
 
+    def show_error(self, message):
+        QMessageBox.warning(self.ui, "Erro", message)
+
+    def cancel_download(self):
+        # The thread object is deleted once it finishes
+        try:
+            if self.download_thread is not None and self.download_thread.isRunning():
+                self.download_thread.cancel()
+        except RuntimeError:
+            self.download_thread = None
+
     def start_progress(self):
         self.ui.progressBar.show()
         self.ui.progress_sug.show()
@@ -55,6 +68,7 @@ class Download_Tables_Logic(BaseLogic):
                                               pedidos_selected_date, faturamento_selected_date)
         self.download_thread.progress_started.connect(self.start_progress)
         self.download_thread.progress_stopped.connect(self.stop_progress)
+        self.download_thread.failed_with_error.connect(self.show_error)
         self.download_thread.finished.connect(self.on_thread_finished)
         self.download_thread.start()
 
@@ -73,6 +87,7 @@ class SugestaoLogic(BaseLogic):
         self.download_thread = DownloadThread(create_final_df, filial, True)
         self.download_thread.progress_started.connect(self.start_progress)
         self.download_thread.progress_stopped.connect(self.stop_progress)
+        self.download_thread.failed_with_error.connect(self.show_error)
         self.download_thread.start()
 
 
@@ -90,6 +105,7 @@ class BuscaLogic(BaseLogic):
         self.download_thread = DownloadThread(search_function, product_id)
         self.download_thread.progress_started.connect(self.start_progress)
         self.download_thread.progress_stopped.connect(self.stop_progress)
+        self.download_thread.failed_with_error.connect(self.show_error)
 
         # Connect both update_labels to the finished_with_result signal
         self.download_thread.finished_with_result.connect(self.update_labels)
@@ -304,9 +320,18 @@ class Analysis_Report_Logic(BaseLogic):
         self.download_thread = DownloadThread(create_report, filial, periodo, False)
         self.download_thread.progress_started.connect(self.start_progress)
         self.download_thread.progress_stopped.connect(self.stop_progress)
+        self.download_thread.failed_with_error.connect(self.show_error)
+        self.download_thread.finished_with_result.connect(self.show_data_as_of)
         self.download_thread.finished.connect(self.on_thread_finished)
         self.download_thread.start()
 
+    def show_data_as_of(self, report_df):
+        # Tell the user when the report was built from cached metrics
+        data_as_of = getattr(report_df, 'attrs', {}).get('data_as_of')
+        if data_as_of is not None:
+            QMessageBox.information(self.ui, "Relatório",
+                                    f"Relatório gerado com dados de {data_as_of:%d/%m/%Y %H:%M}.")
+
 
 class Table_Search_Logic(BaseLogic):
 
@@ -315,6 +340,7 @@ class Table_Search_Logic(BaseLogic):
         self.checkboxes = None
         self.table_name = None
         self.column_names = None
+        self.preview_dialog = None
         self.setup_connections()
 
     def setup_connections(self):
@@ -329,6 +355,7 @@ class Table_Search_Logic(BaseLogic):
         self.download_thread = DownloadThread(get_table_columns, table_name)
         self.download_thread.progress_started.connect(self.start_progress)
         self.download_thread.progress_stopped.connect(self.stop_progress)
+        self.download_thread.failed_with_error.connect(self.show_error)
 
         self.download_thread.finished_with_result.connect(self.update_label_checkboxes)
 
@@ -351,8 +378,9 @@ class Table_Search_Logic(BaseLogic):
 
             # Create checkboxes based on columns
             self.checkboxes = {}
-            for column in columns:
-                checkbox = QCheckBox(column)
+            for column, title in columns.items():
+                # Show the SX3 title next to the column name when the dictionary has one
+                checkbox = QCheckBox(f"{column} - {title}" if title else column)
                 self.checkboxes[column] = checkbox
                 layout.addWidget(checkbox)
 
@@ -390,10 +418,8 @@ class Table_Search_Logic(BaseLogic):
         if self.column_names and self.table_name:
             columns = self.column_names
             table = self.table_name
-            columns_str = ', '.join(columns)
 
-            self.download_thread = DownloadThread(download_save_table, columns_str, table)
-            self.download_thread.progress_started.connect(self.start_progress)
-            self.download_thread.progress_stopped.connect(self.stop_progress)
-            self.download_thread.finished.connect(self.on_thread_finished)
-            self.download_thread.start()
+            # Preview the selected columns first, the full export is offered from the preview
+            self.preview_dialog = TablePreviewDialog(self.ui, table, columns)
+            self.preview_dialog.start_preview()
+            self.preview_dialog.exec_()
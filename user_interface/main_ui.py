@@ -1,16 +1,48 @@
+import importlib
 import logging
 import os
+import threading
 from datetime import datetime
-from PyQt5.QtWidgets import QMainWindow
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtWidgets import QMainWindow, QShortcut
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QPoint, QTimer
 from .design import Ui_MainWindow
 from .logic import Download_Tables_Logic, SugestaoLogic, BuscaLogic, Analysis_Report_Logic, Table_Search_Logic
-from .download_thread import DownloadThread
-from database_functions.params_update import save_excel_locally
-from main_functions.sugestao_compra import create_final_df
+from .download_thread import DownloadThread, lazy_function
 
 logger = logging.getLogger(__name__)
 
+# Heavy modules imported in the background once the window is shown
+WARM_UP_MODULES = [
+    'pandas',
+    'numpy',
+    'openpyxl',
+    'sqlalchemy',
+    'database_functions.funcoes_base',
+    'main_functions.sugestao_compra',
+    'main_functions.analise_inventario',
+    'main_functions.download_tabelas',
+    'main_functions.busca_produtos',
+    'main_functions.busca_tabelas',
+]
+
+
+def warm_up_imports():
+    """Import the data stack in the background so the first button click does not wait for it."""
+    for module_name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.error(f"Could not warm up {module_name}: {e}")
+    logger.info("Background imports finished.")
+
+
+# Interval between checks for a due inventory snapshot, in milliseconds
+SNAPSHOT_CHECK_INTERVAL = 15 * 60 * 1000
+
+# Delay before the startup work begins, giving the window time to paint, in milliseconds
+STARTUP_DEFER_INTERVAL = 200
+
 
 class MainWindowLogic(QMainWindow, Ui_MainWindow):
 
@@ -24,13 +56,22 @@ class MainWindowLogic(QMainWindow, Ui_MainWindow):
         self.setWindowFlags(Qt.FramelessWindowHint)
         self._dragging = False
         self._drag_position = QPoint()
-        self.start_download_threads()
+        # Start the daily update and the background imports once the window has been painted
+        QTimer.singleShot(STARTUP_DEFER_INTERVAL, self.start_download_threads)
+        QTimer.singleShot(STARTUP_DEFER_INTERVAL, self.start_warm_up)
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self.check_inventory_snapshot)
+        self.snapshot_timer.start(SNAPSHOT_CHECK_INTERVAL)
         self.download_tables_logic = Download_Tables_Logic(self)
         self.sugestao_logic = SugestaoLogic(self)
         self.search_logic = BuscaLogic(self)
         self.report_logic = Analysis_Report_Logic(self)
         self.table_search_logic = Table_Search_Logic(self)
 
+        # Esc cancels the running queries at the driver level
+        self.cancel_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        self.cancel_shortcut.activated.connect(self.cancel_running_work)
+
         self.progressBar.hide()
         self.progress_sug.hide()
         self.progressBar_search.hide()
@@ -59,6 +100,14 @@ class MainWindowLogic(QMainWindow, Ui_MainWindow):
         self.utility_frame.mouseMoveEvent = self.utility_frame_mouseMoveEvent
         self.utility_frame.mouseReleaseEvent = self.utility_frame_mouseReleaseEvent
 
+    def start_warm_up(self):
+        threading.Thread(target=warm_up_imports, name="warm_up_imports", daemon=True).start()
+
+    def cancel_running_work(self):
+        for logic in (self.download_tables_logic, self.sugestao_logic, self.search_logic, self.report_logic,
+                      self.table_search_logic):
+            logic.cancel_download()
+
     def switch_view(self, index):
         self.view.setCurrentIndex(index)
 
@@ -97,7 +146,7 @@ class MainWindowLogic(QMainWindow, Ui_MainWindow):
         if not self.has_update_occurred_today():
             # Start the thread for updating the Excel files
             self.update_excel_thread = DownloadThread(
-                save_excel_locally,
+                lazy_function('database_functions.params_update', 'save_excel_locally'),
                 "Dados_Sug.xlsx",
                 shared_folder_path="Z:\\09 - Pecas\\Sgc"
             )
@@ -106,9 +155,7 @@ class MainWindowLogic(QMainWindow, Ui_MainWindow):
 
             # Start the thread for creating the stock suggestion file
             self.create_df_thread = DownloadThread(
-                create_final_df,
-                'Todas',
-                False
+                lazy_function('main_functions.sugestao_compra', 'update_base_df')
             )
             self.create_df_thread.finished_with_result.connect(self.on_create_df_finished)
             self.create_df_thread.progress_started.connect(self.on_progress_started)
@@ -118,9 +165,23 @@ class MainWindowLogic(QMainWindow, Ui_MainWindow):
             logger.error("Application update has already been processed today")
 
     def on_create_df_finished(self, result):
-        # Handle the result of the df creation
-        save_excel_locally("Base_df.xlsx", data=result)
-
+        # Base_df and the stock indicator were saved by the worker thread, which may still be winding down
+        self.start_inventory_snapshot()
+
+    def check_inventory_snapshot(self):
+        # Skip the tick while Base_df.xlsx is still being written, the base update starts the check when done
+        if self.create_df_thread is not None and self.create_df_thread.isRunning():
+            return
+        self.start_inventory_snapshot()
+
+    def start_inventory_snapshot(self):
+        # The worker checks whether the snapshot is due, so neither the import nor the file stat block the GUI
+        if self.update_inv_thread is not None and self.update_inv_thread.isRunning():
+            return
+
+        self.update_inv_thread = DownloadThread(
+            lazy_function('main_functions.analise_inventario', 'update_inventory_snapshot_if_due')
+        )
         self.update_inv_thread.start()
 
     def on_progress_started(self):
@@ -0,0 +1,166 @@
+import logging
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QDate
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QCheckBox, QDateEdit, QSpinBox,
+                             QPushButton, QTableView, QMessageBox)
+from .download_thread import DownloadThread, lazy_function
+
+logger = logging.getLogger(__name__)
+
+# Table explorer functions, imported by the worker threads on first use
+preview_table = lazy_function('main_functions.busca_tabelas', 'preview_table')
+download_save_table = lazy_function('main_functions.busca_tabelas', 'download_save_table')
+
+# Rows shown by a preview unless the user asks for more, and the most a preview may return
+PREVIEW_ROWS = 200
+PREVIEW_MAX_ROWS = 5000
+
+BRANCHES = ['Todas', '0101', '0103', '0104', '0105']
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Read-only model over a DataFrame. The view only asks for the visible cells, so large previews are
+    never turned into widgets.
+    """
+
+    def __init__(self, data_frame=None, parent=None):
+        super().__init__(parent)
+        self.data_frame = data_frame
+
+    def set_data_frame(self, data_frame):
+        self.beginResetModel()
+        self.data_frame = data_frame
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if self.data_frame is None or parent.isValid() else len(self.data_frame)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if self.data_frame is None or parent.isValid() else len(self.data_frame.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return QVariant()
+        value = self.data_frame.iat[index.row(), index.column()]
+        # Missing values of every dtype (None, NaN, NaT, pd.NA) are shown as empty cells
+        if pd.api.types.is_scalar(value) and pd.isna(value):
+            return ""
+        return str(value).strip()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return str(self.data_frame.columns[section])
+        return str(section + 1)
+
+
+class TablePreviewDialog(QDialog):
+    """
+    Preview the selected columns of a table with TOP N and the branch and period filters, and offer the
+    full export, with the same filters, once a preview was shown.
+    """
+
+    def __init__(self, parent, table, columns):
+        super().__init__(parent)
+        self.table = table
+        self.columns = columns
+        self.download_thread = None
+
+        self.setWindowTitle(f"Pré-visualização - {table}")
+        self.resize(900, 600)
+
+        # Filters
+        self.filial_select = QComboBox()
+        self.filial_select.addItems(BRANCHES)
+        self.period_check = QCheckBox("Período:")
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_to = QDateEdit(QDate.currentDate())
+        for date_edit in (self.date_from, self.date_to):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd/MM/yyyy")
+        self.rows_select = QSpinBox()
+        self.rows_select.setRange(1, PREVIEW_MAX_ROWS)
+        self.rows_select.setValue(PREVIEW_ROWS)
+
+        filters_layout = QHBoxLayout()
+        filters_layout.addWidget(QLabel("Filial:"))
+        filters_layout.addWidget(self.filial_select)
+        filters_layout.addWidget(self.period_check)
+        filters_layout.addWidget(self.date_from)
+        filters_layout.addWidget(self.date_to)
+        filters_layout.addWidget(QLabel("Linhas:"))
+        filters_layout.addWidget(self.rows_select)
+        filters_layout.addStretch()
+
+        # Preview
+        self.model = DataFrameModel()
+        self.table_view = QTableView()
+        self.table_view.setModel(self.model)
+        self.status_label = QLabel("")
+
+        # Actions, the full export is offered after a preview
+        self.preview_button = QPushButton("Pré-visualizar")
+        self.export_button = QPushButton("Exportar tabela completa")
+        self.export_button.setEnabled(False)
+        self.preview_button.clicked.connect(self.start_preview)
+        self.export_button.clicked.connect(self.start_export)
+
+        actions_layout = QHBoxLayout()
+        actions_layout.addWidget(self.status_label)
+        actions_layout.addStretch()
+        actions_layout.addWidget(self.preview_button)
+        actions_layout.addWidget(self.export_button)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(filters_layout)
+        layout.addWidget(self.table_view)
+        layout.addLayout(actions_layout)
+
+    def filters(self):
+        date_from = self.date_from.date().toPyDate() if self.period_check.isChecked() else None
+        date_to = self.date_to.date().toPyDate() if self.period_check.isChecked() else None
+        return {
+            'filial': self.filial_select.currentText(),
+            'date_from': date_from,
+            'date_to': date_to,
+        }
+
+    def start_thread(self, func, *args, **kwargs):
+        self.preview_button.setEnabled(False)
+        self.export_button.setEnabled(False)
+
+        self.download_thread = DownloadThread(func, *args, **kwargs)
+        self.download_thread.failed_with_error.connect(self.show_error)
+        self.download_thread.progress_stopped.connect(self.on_thread_stopped)
+        return self.download_thread
+
+    def start_preview(self):
+        self.status_label.setText("Carregando...")
+        thread = self.start_thread(preview_table, self.columns, self.table, limit=self.rows_select.value(),
+                                   **self.filters())
+        thread.finished_with_result.connect(self.show_preview)
+        thread.start()
+
+    def show_preview(self, data_frame):
+        self.model.set_data_frame(data_frame)
+        self.status_label.setText(f"{len(data_frame)} linhas")
+
+    def start_export(self):
+        self.status_label.setText("Exportando...")
+        self.start_thread(download_save_table, self.columns, self.table, **self.filters()).start()
+
+    def on_thread_stopped(self):
+        self.preview_button.setEnabled(True)
+        self.export_button.setEnabled(self.model.rowCount() > 0)
+
+    def show_error(self, message):
+        self.status_label.setText("")
+        QMessageBox.warning(self, "Erro", message)
+
+    def reject(self):
+        # Esc or closing the dialog stops the running query
+        if self.download_thread is not None and self.download_thread.isRunning():
+            self.download_thread.cancel()
+        super().reject()